@@ -0,0 +1,202 @@
+"""
+准入控制模块
+
+- 流级准入：限制同时进行的生成流数量，超出时进入有界等待队列，
+  队列已满时在请求开始前直接以 429 + Retry-After 拒绝，避免生成到一半失败；
+- 调用级限流：每次上游链调用都需获取全局和按模型的并发信号量，
+  并从按模型的令牌桶中扣除预估的请求数（RPM）和 token 数（TPM）。
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+from metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED
+from tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """等待队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"服务繁忙，请在 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """按分钟速率匀速补充的令牌桶，rate 为 0 表示不限制"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float):
+        if self.rate <= 0:
+            return
+        # 单次请求超过桶容量时按容量计，避免永远等待
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AdmissionTicket:
+    """一个生成流的准入凭证"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.granted = asyncio.Event()
+        self.released = False
+        # 生成流开始使用凭证后由生成流负责释放
+        self.claimed = False
+        self.started_at = time.monotonic()
+
+    async def wait(self) -> AsyncIterator[int]:
+        """等待准入，排队期间定期返回当前排队位置"""
+        last_position = None
+        while not self.granted.is_set():
+            position = self.controller.position(self)
+            if position != last_position:
+                last_position = position
+                yield position
+            try:
+                await asyncio.wait_for(self.granted.wait(), timeout=self.controller.hint_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+    def release_unclaimed(self):
+        """响应结束时调用：凭证从未被生成流使用（例如客户端在开始读取响应体之前断开）时释放名额"""
+        if not self.claimed:
+            self.release()
+
+
+class AdmissionController:
+    """生成流准入和上游调用限流"""
+
+    def __init__(self, settings):
+        self.max_active_streams = max(1, settings.max_active_streams)
+        self.queue_size = settings.admission_queue_size
+        self.hint_interval = 2.0
+        self.rpm = settings.upstream_rpm
+        self.tpm = settings.upstream_tpm
+        self.expected_output_tokens = settings.expected_output_tokens
+        self.max_concurrency_per_model = max(1, settings.max_upstream_concurrency_per_model)
+        self._upstream_semaphore = asyncio.Semaphore(max(1, settings.max_upstream_concurrency))
+        self._model_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        self._active = 0
+        self._waiting: Deque[AdmissionTicket] = deque()
+        self._avg_stream_seconds = 30.0
+
+    @property
+    def active_streams(self) -> int:
+        return self._active
+
+    @property
+    def queued_streams(self) -> int:
+        return len(self._waiting)
+
+    def admit(self) -> AdmissionTicket:
+        """申请一个生成流名额，队列已满时抛出 AdmissionRejected"""
+        ticket = AdmissionTicket(self)
+        if self._active < self.max_active_streams and not self._waiting:
+            self._active += 1
+            ticket.granted.set()
+        elif len(self._waiting) >= self.queue_size:
+            ADMISSION_REJECTED.inc()
+            raise AdmissionRejected(self.retry_after())
+        else:
+            self._waiting.append(ticket)
+            ADMISSION_QUEUE_DEPTH.set(len(self._waiting))
+        return ticket
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def retry_after(self) -> int:
+        """按平均生成时长估算队列腾出位置的时间"""
+        rounds = len(self._waiting) / self.max_active_streams + 1
+        return max(1, int(rounds * self._avg_stream_seconds))
+
+    def _release(self, ticket: AdmissionTicket):
+        if ticket.granted.is_set():
+            duration = time.monotonic() - ticket.started_at
+            self._avg_stream_seconds = 0.8 * self._avg_stream_seconds + 0.2 * duration
+            self._active -= 1
+            while self._waiting and self._active < self.max_active_streams:
+                waiting = self._waiting.popleft()
+                waiting.started_at = time.monotonic()
+                self._active += 1
+                waiting.granted.set()
+        elif ticket in self._waiting:
+            self._waiting.remove(ticket)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiting))
+
+    def _buckets(self, model: str):
+        if model not in self._request_buckets:
+            self._request_buckets[model] = TokenBucket(self.rpm)
+            self._token_buckets[model] = TokenBucket(self.tpm)
+            self._model_semaphores[model] = asyncio.Semaphore(self.max_concurrency_per_model)
+        return self._request_buckets[model], self._token_buckets[model], self._model_semaphores[model]
+
+    async def stream(self, ticket: Optional[AdmissionTicket], factory, queue_hint=None) -> AsyncIterator[str]:
+        """准入后再开始生成；queue_hint 用于把排队位置转换为输出给客户端的内容"""
+        try:
+            if ticket is not None:
+                ticket.claimed = True
+                async for position in ticket.wait():
+                    logger.info(f"⏳ 生成请求排队中，当前位置: {position}")
+                    if queue_hint is not None:
+                        yield queue_hint(position)
+            source = factory()
+            try:
+                async for chunk in source:
+                    yield chunk
+            finally:
+                await source.aclose()
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+
+class AdmittedChain:
+    """每次上游调用前获取并发名额和速率配额的生成链"""
+
+    def __init__(self, controller: AdmissionController, model: str, prompt, chain):
+        self.controller = controller
+        self.model = model
+        self.prompt = prompt
+        self.chain = chain
+
+    async def astream(self, inputs: dict, on_admitted: Callable[[], None] = None) -> AsyncIterator[str]:
+        """on_admitted 在获取到名额和配额、真正调用上游之前调用"""
+        request_bucket, token_bucket, model_semaphore = self.controller._buckets(self.model)
+        tokens = estimate_tokens(self.prompt.format(**inputs)) + self.controller.expected_output_tokens
+        async with self.controller._upstream_semaphore, model_semaphore:
+            await request_bucket.acquire(1)
+            await token_bucket.acquire(tokens)
+            if on_admitted is not None:
+                on_admitted()
+            async for chunk in self.chain.astream(inputs):
+                yield chunk
@@ -0,0 +1,407 @@
+"""
+生成后端
+
+生成链由可替换的后端提供，通过 GENERATION_BACKEND 选择：
+
+- openai：调用 OpenAI 兼容接口（LLMRegistry），设置 RECORD_PATH 时把每次的 token 流
+  录制到 JSONL 文件；
+- replay：按 (链名称, 输入) 重放录制的 token 流，按录制时的间隔（REPLAY_SPEED 倍速）输出，
+  结果确定，用于离线复现和压测；
+- template：根据输入在本地直接拼出结构合理的大纲和页面，默认无延迟，
+  用于单独测量后端自身（分帧、解析、序列化）的吞吐。
+
+所有后端提供相同的接口：get_chain(name, prompt, model_config, response_format=None)
+返回带 astream(inputs) 的生成链（传入 response_format 时输出结构化的 {"pages": [...]}），以及 warm_up() / connect(endpoints) / aclose()。设置 DEGRADED_FALLBACK 后，
+上游全部失败时由 template 后端生成降级内容。
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+from llm_registry import LLMRegistry
+from metrics import DEGRADED_CALLS
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("openai", "replay", "template")
+
+# 最近一次降级生成的时间（time.monotonic()）
+_last_degraded = float("-inf")
+
+
+def degraded_since(started: float) -> bool:
+    """started（time.monotonic()）之后是否有调用改用了降级生成"""
+    return _last_degraded >= started
+
+
+def mark_degraded(name: str, error: Exception):
+    """记录一次改用降级生成的调用"""
+    global _last_degraded
+    logger.warning(f"🩹 上游不可用，使用本地模板生成 {name}: {str(error)}")
+    DEGRADED_CALLS.labels(name).inc()
+    _last_degraded = time.monotonic()
+
+
+def stream_key(name: str, inputs: dict) -> str:
+    """录制和重放使用的键：链名称 + 输入"""
+    payload = json.dumps([name, inputs], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stream_name(name: str, response_format: dict = None) -> str:
+    """录制和重放使用的链名称：结构化输出与逐行输出的 token 流分开保存"""
+    return name if response_format is None else f"{name}:{response_format['type']}"
+
+
+def split_chunks(text: str, size: int) -> List[str]:
+    size = max(1, size)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StreamRecorder:
+    """把生成链输出的 token 流和分块间隔追加写入 JSONL 文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def save(self, name: str, inputs: dict, chunks: List[str], delays: List[float]):
+        record = {"key": stream_key(name, inputs), "chain": name, "chunks": chunks, "delays": delays}
+        try:
+            await asyncio.to_thread(self._append, record)
+        except OSError as e:
+            logger.warning(f"⚠️ 写入录制文件失败: {str(e)}")
+
+
+class RecordingChain:
+    """完整输出后把 token 流交给录制器，中途失败的流不录制"""
+
+    def __init__(self, name: str, chain, recorder: StreamRecorder):
+        self.name = name
+        self.chain = chain
+        self.recorder = recorder
+
+    async def astream(self, inputs: dict) -> AsyncIterator[str]:
+        chunks, delays = [], []
+        last = time.perf_counter()
+        async for chunk in self.chain.astream(inputs):
+            now = time.perf_counter()
+            chunks.append(chunk)
+            delays.append(round(now - last, 4))
+            last = now
+            yield chunk
+        await self.recorder.save(self.name, inputs, chunks, delays)
+
+
+class RecordingRegistry:
+    """在 LLMRegistry 的生成链外层加上录制"""
+
+    def __init__(self, registry: LLMRegistry, recorder: StreamRecorder):
+        self.registry = registry
+        self.recorder = recorder
+
+    def get_chain(self, name: str, prompt, model_config: dict, response_format: dict = None):
+        chain = self.registry.get_chain(name, prompt, model_config, response_format)
+        return RecordingChain(stream_name(name, response_format), chain, self.recorder)
+
+    def warm_up(self):
+        self.registry.warm_up()
+
+    async def connect(self, endpoints: List[dict]):
+        await self.registry.connect(endpoints)
+
+    async def aclose(self):
+        await self.registry.aclose()
+
+
+class LocalBackend:
+    """本地后端的公共部分：无需预热和连接"""
+
+    def warm_up(self):
+        pass
+
+    async def connect(self, endpoints: List[dict]):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class ReplayChain:
+    def __init__(self, backend: "ReplayBackend", name: str):
+        self.backend = backend
+        self.name = name
+
+    async def astream(self, inputs: dict) -> AsyncIterator[str]:
+        chunks, delays = self.backend.lookup(self.name, inputs)
+        speed = self.backend.speed
+        for chunk, delay in zip(chunks, delays):
+            if speed > 0 and delay > 0:
+                await asyncio.sleep(delay / speed)
+            yield chunk
+
+
+class ReplayBackend(LocalBackend):
+    """重放录制的 token 流
+
+    输入完全相同时重放对应的录制；否则在同一条链的录制中按输入的哈希确定性地选择一条。
+    """
+
+    def __init__(self, path: str, speed: float):
+        self.path = path
+        self.speed = speed
+        self._by_key: Dict[str, Tuple[List[str], List[float]]] = {}
+        self._by_chain: Dict[str, List[Tuple[List[str], List[float]]]] = {}
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ 录制文件不存在: {path}")
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                stream = (record["chunks"], record.get("delays") or [0.0] * len(record["chunks"]))
+                self._by_key[record["key"]] = stream
+                self._by_chain.setdefault(record["chain"], []).append(stream)
+        logger.info(f"📼 已加载 {len(self._by_key)} 条录制 ({path})")
+
+    def lookup(self, name: str, inputs: dict) -> Tuple[List[str], List[float]]:
+        key = stream_key(name, inputs)
+        stream = self._by_key.get(key)
+        if stream is not None:
+            return stream
+        candidates = self._by_chain.get(name)
+        if not candidates:
+            raise RuntimeError(f"没有可重放的录制: {name}")
+        return candidates[int(key, 16) % len(candidates)]
+
+    def get_chain(self, name: str, prompt, model_config: dict, response_format: dict = None):
+        return ReplayChain(self, stream_name(name, response_format))
+
+
+def _is_english(language: str) -> bool:
+    language = language.strip().lower()
+    return language.startswith("en") or language.startswith("英")
+
+
+def _topic(content: str) -> str:
+    lines = [line.strip(" #-\t") for line in content.splitlines() if line.strip(" #-\t")]
+    topic = lines[0] if lines else "演示文稿"
+    return topic[:30]
+
+
+# 本地生成的大纲结构：(章节标题模板, [小节名称])
+OUTLINE_ZH = [
+    ("{topic}的背景与意义", ["发展背景", "现实意义", "研究现状"]),
+    ("{topic}的核心概念", ["基本定义", "主要特征", "关键要素"]),
+    ("{topic}的方法与实践", ["常用方法", "实施步骤", "典型案例"]),
+    ("{topic}的挑战与展望", ["面临的挑战", "应对策略", "未来趋势"]),
+]
+OUTLINE_EN = [
+    ("Background of {topic}", ["Origins", "Why It Matters", "Current State"]),
+    ("Core Concepts of {topic}", ["Definitions", "Key Features", "Building Blocks"]),
+    ("{topic} in Practice", ["Common Methods", "Implementation Steps", "Case Studies"]),
+    ("Challenges and Outlook", ["Open Challenges", "Strategies", "Future Trends"]),
+]
+ITEMS_ZH = ["{section}的主要内容", "{section}的关键因素", "{section}的实际价值"]
+ITEMS_EN = ["Overview of {section}", "Key Factors", "Practical Value"]
+
+
+def build_outline(content: str, language: str) -> str:
+    english = _is_english(language)
+    topic = _topic(content)
+    lines = [f"# {topic}"]
+    for chapter, sections in (OUTLINE_EN if english else OUTLINE_ZH):
+        lines.append(f"## {chapter.format(topic=topic)}")
+        for section in sections:
+            lines.append(f"### {section}")
+            for item in (ITEMS_EN if english else ITEMS_ZH):
+                lines.append(f"- {item.format(section=section)}")
+    return "\n".join(lines)
+
+
+def _dump_pages(pages: List[dict]) -> str:
+    return "\n\n".join(json.dumps(page, ensure_ascii=False) for page in pages)
+
+
+def build_cover_contents(content: str, language: str) -> str:
+    english = _is_english(language)
+    title = re.search(r"^#\s+(.+)$", content, re.M)
+    chapters = re.findall(r"^##\s+(.+)$", content, re.M)
+    title = title.group(1).strip() if title else _topic(content)
+    text = f"An overview of {title}" if english else f"全面了解{title}的核心内容"
+    return _dump_pages([
+        {"type": "cover", "data": {"title": title, "text": text}},
+        {"type": "contents", "data": {"items": [c.strip() for c in chapters] or [title]}},
+    ])
+
+
+def build_section_pages(title: str, content: str, language: str) -> List[dict]:
+    """按章节大纲中的小节和要点生成过渡页和内容页"""
+    english = _is_english(language)
+    text = f"This part covers {title}" if english else f"接下来介绍{title}"
+    pages = [{"type": "transition", "data": {"title": title, "text": text}}]
+    section, items = None, []
+
+    def flush():
+        if section is None:
+            return
+        entries = items or [section]
+        pages.append({"type": "content", "data": {"title": section, "items": [
+            {
+                "title": entry,
+                "text": (f"{entry}: explained with the key points and a practical example of {section}."
+                         if english else f"{entry}：围绕{section}展开说明，结合实例阐述其作用与价值。"),
+            }
+            for entry in entries
+        ]}})
+
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith("###"):
+            flush()
+            section, items = line.lstrip("#").strip(), []
+        elif line.startswith("-") and section is not None:
+            items.append(line.lstrip("-").strip())
+    if section is None:
+        section = title
+    flush()
+    return pages
+
+
+def build_chapter_group(chapters: str, language: str) -> str:
+    pages = []
+    blocks = re.split(r"^第\d+个章节$", chapters, flags=re.M)[1:]
+    for number, block in enumerate(blocks, start=1):
+        title = re.search(r"章节标题：(.*)", block)
+        content = block.split("章节内容：", 1)[-1]
+        for page in build_section_pages(title.group(1).strip() if title else "", content, language):
+            pages.append({"chapter": number, **page})
+    return _dump_pages(pages)
+
+
+def build_repair(page: str, language: str) -> str:
+    """按不合法页面中能识别出的类型和标题重新拼出一页"""
+    page_type = re.search(r'"type"\s*:\s*"(\w+)"', page)
+    title = re.search(r'"title"\s*:\s*"([^"]*)"', page)
+    page_type = page_type.group(1) if page_type else "content"
+    title = title.group(1) if title else ("Presentation" if _is_english(language) else "演示文稿")
+    if page_type in ("cover", "contents"):
+        pages = build_cover_contents(f"# {title}", language).split("\n\n")
+        return pages[0] if page_type == "cover" else pages[1]
+    pages = build_section_pages(title, "", language)
+    return _dump_pages(pages[:1] if page_type == "transition" else pages[1:])
+
+
+def structured_reply(text: str) -> str:
+    """把逐页输出的页面转换为结构化输出格式 {"pages": [...]}"""
+    pages = [json.loads(page) for page in text.split("\n\n") if page.strip()]
+    return json.dumps({"pages": pages}, ensure_ascii=False)
+
+
+def build_reply(name: str, inputs: dict) -> str:
+    """按链名称和输入生成完整输出"""
+    language = inputs.get("language", "")
+    if name == "outline":
+        return build_outline(inputs.get("content", ""), language)
+    if name == "cover_contents":
+        return build_cover_contents(inputs.get("content", ""), language)
+    if name == "chapter_group":
+        return build_chapter_group(inputs.get("chapters", ""), language)
+    if name == "page_repair":
+        return build_repair(inputs.get("page", ""), language)
+    return _dump_pages(build_section_pages(
+        inputs.get("section_title", ""), inputs.get("section_content", ""), language
+    ))
+
+
+class TemplateChain:
+    def __init__(self, backend: "TemplateBackend", name: str, structured: bool = False):
+        self.backend = backend
+        self.name = name
+        self.structured = structured
+
+    async def astream(self, inputs: dict) -> AsyncIterator[str]:
+        delay = 1 / self.backend.tokens_per_sec if self.backend.tokens_per_sec > 0 else 0
+        reply = build_reply(self.name, inputs)
+        if self.structured:
+            reply = structured_reply(reply)
+        for chunk in split_chunks(reply, self.backend.chunk_chars):
+            # 无延迟时同样让出事件循环，与真实流式输出的调度方式一致
+            await asyncio.sleep(delay)
+            yield chunk
+
+
+class TemplateBackend(LocalBackend):
+    """本地模板生成：确定性输出，tokens_per_sec 为 0 时无延迟"""
+
+    def __init__(self, tokens_per_sec: float = 0, chunk_chars: int = 4):
+        self.tokens_per_sec = tokens_per_sec
+        self.chunk_chars = chunk_chars
+
+    def get_chain(self, name: str, prompt, model_config: dict, response_format: dict = None):
+        return TemplateChain(self, name, response_format is not None)
+
+
+class DegradedChain:
+    """主生成链在输出第一个分块之前失败时，改用本地模板生成降级内容
+
+    只用于没有自身重试的生成链（大纲）；页面生成链在按章节重试耗尽后才降级（见 main.stream_parsed_pages）。
+    """
+
+    def __init__(self, name: str, chain, fallback):
+        self.name = name
+        self.chain = chain
+        self.fallback = fallback
+
+    async def astream(self, inputs: dict, on_admitted: Callable[[], None] = None) -> AsyncIterator[str]:
+        stream = self.chain.astream(inputs, on_admitted=on_admitted)
+        try:
+            try:
+                first_chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                mark_degraded(self.name, e)
+                first_chunk = None
+            if first_chunk is None:
+                async for chunk in self.fallback.astream(inputs):
+                    yield chunk
+                return
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+
+def create_generation_backend(settings):
+    """根据配置创建生成后端"""
+    backend = settings.resolved_backend
+    if backend != settings.generation_backend:
+        logger.warning(f"⚠️ 未知的生成后端 {settings.generation_backend}，使用 openai")
+    if backend == "template":
+        logger.info("🧪 生成后端: 本地模板")
+        return TemplateBackend(settings.backend_tokens_per_sec, settings.backend_chunk_chars)
+    if backend == "replay":
+        logger.info(f"📼 生成后端: 重放录制 ({settings.replay_path}, {settings.replay_speed:g} 倍速)")
+        return ReplayBackend(settings.replay_path, settings.replay_speed)
+    registry = LLMRegistry(settings)
+    if settings.record_path:
+        logger.info(f"📼 录制上游输出到 {settings.record_path}")
+        return RecordingRegistry(registry, StreamRecorder(settings.record_path))
+    return registry
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+对比两次压测结果
+
+用法:
+    python bench/compare.py bench/results/base.json bench/results/new.json
+"""
+import sys
+import json
+
+METRICS = [
+    ("ttfb", "p50"), ("ttfb", "p95"),
+    ("first_page", "p50"), ("first_page", "p95"),
+    ("total", "p50"), ("total", "p95"), ("total", "p99"),
+]
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def change(old, new) -> str:
+    if old is None or new is None:
+        return "-"
+    if old == 0:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        return 1
+    base, new = load(sys.argv[1]), load(sys.argv[2])
+    print(f"基准 {base['commit']} ({base['timestamp']})  →  对比 {new['commit']} ({new['timestamp']})")
+    for scenario, new_result in new["scenarios"].items():
+        old_result = base["scenarios"].get(scenario)
+        if old_result is None:
+            continue
+        print(f"\n📊 {scenario}")
+        for metric, stat in METRICS:
+            old_value, new_value = old_result[metric][stat], new_result[metric][stat]
+            if old_value is None or new_value is None:
+                continue
+            print(f"   {metric:<11}{stat:<4} {old_value * 1000:>9.0f}ms → {new_value * 1000:>9.0f}ms  {change(old_value, new_value)}")
+        for key in ("requests_per_sec", "pages_per_sec"):
+            print(f"   {key:<15} {old_result[key]:>9.2f} → {new_result[key]:>9.2f}  {change(old_result[key], new_result[key])}")
+        old_proc, new_proc = old_result.get("process"), new_result.get("process")
+        if old_proc and new_proc:
+            print(f"   cpu_seconds     {old_proc['cpu_seconds']:>9.2f} → {new_proc['cpu_seconds']:>9.2f}  {change(old_proc['cpu_seconds'], new_proc['cpu_seconds'])}")
+            print(f"   rss_peak_mb     {old_proc['rss_peak_bytes'] / 1048576:>9.1f} → {new_proc['rss_peak_bytes'] / 1048576:>9.1f}  {change(old_proc['rss_peak_bytes'], new_proc['rss_peak_bytes'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
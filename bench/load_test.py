@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+压测与延迟基准脚本
+
+以指定并发请求 /tools/aippt_outline、/tools/aippt 和 /data/{filename}.json，
+统计 TTFB、首页耗时、总耗时的 p50/p95/p99、页面吞吐量以及服务进程的 CPU/内存，
+结果保存为 JSON 便于跨提交对比。
+
+用法:
+    python bench/load_test.py --concurrency 8 --requests 32 --server-pid $(pgrep -f "main.py")
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+
+import httpx
+
+SAMPLE_OUTLINE = """# 人工智能在教育领域的应用
+## 人工智能教育概述
+### AI教育的定义与意义
+- 人工智能技术在教育中的应用
+- 提升教学效果和学习体验
+- 推动教育现代化发展
+### AI教育的发展历程
+- 早期探索阶段
+- 技术突破期
+- 规模化应用期
+## 具体应用场景
+### 个性化学习
+- 智能推荐学习内容
+- 自适应学习路径
+- 学习效果评估
+## 挑战与展望
+### 面临的挑战
+- 数据隐私
+- 教师角色转变"""
+
+
+def percentile(values, pct: float):
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values):
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else None,
+    }
+
+
+class ProcessSampler:
+    """采样服务进程的 CPU 时间和常驻内存（Linux /proc）"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.rss_samples = []
+        self._task = None
+        self._cpu_start = None
+
+    def _cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def _rss_bytes(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def _sample(self):
+        while True:
+            self.rss_samples.append(self._rss_bytes())
+            await asyncio.sleep(0.5)
+
+    def start(self):
+        if self.pid:
+            self._cpu_start = self._cpu_seconds()
+            self._task = asyncio.create_task(self._sample())
+
+    async def stop(self, wall_time: float):
+        if not self.pid:
+            return None
+        self._task.cancel()
+        cpu = self._cpu_seconds() - self._cpu_start
+        return {
+            "pid": self.pid,
+            "cpu_seconds": cpu,
+            "cpu_percent": cpu / wall_time * 100 if wall_time else None,
+            "rss_peak_bytes": max(self.rss_samples, default=0),
+            "rss_mean_bytes": sum(self.rss_samples) / len(self.rss_samples) if self.rss_samples else 0,
+        }
+
+
+async def run_request(client: httpx.AsyncClient, scenario: str, args) -> dict:
+    """发送一次请求并记录各阶段耗时"""
+    if scenario == "outline":
+        method, url, payload = "POST", "/tools/aippt_outline", {
+            "model": args.model, "language": "中文", "content": args.topic, "stream": True,
+        }
+    elif scenario == "aippt":
+        method, url, payload = "POST", "/tools/aippt", {
+            "model": args.model, "language": "中文", "content": args.outline, "stream": True,
+        }
+    else:
+        method, url, payload = "GET", f"/data/{args.template}.json", None
+
+    started = time.perf_counter()
+    record = {
+        "scenario": scenario, "ok": False, "ttfb": None, "first_page": None, "total": None,
+        "pages": 0, "bytes": 0, "chunks": 0,
+    }
+    try:
+        headers = {"Accept-Encoding": args.accept_encoding}
+        async with client.stream(method, url, json=payload, headers=headers) as response:
+            buffer = ""
+            # 按解压后的分块解析，字节数为实际传输（压缩后）的字节数
+            async for chunk in response.aiter_bytes():
+                now = time.perf_counter() - started
+                if record["ttfb"] is None:
+                    record["ttfb"] = now
+                record["bytes"] = response.num_bytes_downloaded
+                record["chunks"] += 1
+                if scenario == "aippt":
+                    # 按 "\n\n" 分隔统计页面
+                    buffer += chunk.decode("utf-8", errors="ignore")
+                    pages = buffer.count("\n\n")
+                    if pages:
+                        if record["first_page"] is None:
+                            record["first_page"] = now
+                        record["pages"] += pages
+                        buffer = buffer.rsplit("\n\n", 1)[1]
+                elif record["first_page"] is None:
+                    record["first_page"] = now
+            if scenario == "aippt" and buffer.strip():
+                record["pages"] += 1
+            record["ok"] = response.status_code == 200
+            record["status"] = response.status_code
+    except Exception as e:
+        record["error"] = str(e)
+    record["total"] = time.perf_counter() - started
+    return record
+
+
+async def run_scenario(scenario: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        async def bounded():
+            async with semaphore:
+                return await run_request(client, scenario, args)
+
+        sampler = ProcessSampler(args.server_pid)
+        sampler.start()
+        started = time.perf_counter()
+        records = await asyncio.gather(*(bounded() for _ in range(args.requests)))
+        wall_time = time.perf_counter() - started
+        process = await sampler.stop(wall_time)
+
+    ok = [r for r in records if r["ok"]]
+    total_pages = sum(r["pages"] for r in ok)
+    return {
+        "scenario": scenario,
+        "requests": len(records),
+        "succeeded": len(ok),
+        "failed": len(records) - len(ok),
+        "wall_time": wall_time,
+        "requests_per_sec": len(ok) / wall_time if wall_time else None,
+        "pages_per_sec": total_pages / wall_time if wall_time else None,
+        "bytes_received": sum(r["bytes"] for r in records),
+        "chunks_received": sum(r["chunks"] for r in records),
+        "ttfb": summarize([r["ttfb"] for r in ok if r["ttfb"] is not None]),
+        "first_page": summarize([r["first_page"] for r in ok if r["first_page"] is not None]),
+        "total": summarize([r["total"] for r in ok]),
+        "errors": sorted({r.get("error") or f"HTTP {r.get('status')}" for r in records if not r["ok"]}),
+        "process": process,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(result: dict):
+    def fmt(stats):
+        if stats["p50"] is None:
+            return "-"
+        return f"p50={stats['p50'] * 1000:.0f}ms p95={stats['p95'] * 1000:.0f}ms p99={stats['p99'] * 1000:.0f}ms"
+
+    print(f"\n📊 {result['scenario']}: {result['succeeded']}/{result['requests']} 成功, 用时 {result['wall_time']:.2f}s")
+    print(f"   TTFB      {fmt(result['ttfb'])}")
+    print(f"   首页      {fmt(result['first_page'])}")
+    print(f"   总耗时    {fmt(result['total'])}")
+    print(f"   吞吐      {result['requests_per_sec']:.2f} req/s, {result['pages_per_sec']:.2f} pages/s")
+    print(f"   传输      {result['bytes_received']} 字节, {result['chunks_received']} 个分块")
+    if result["process"]:
+        p = result["process"]
+        print(f"   服务进程  CPU {p['cpu_percent']:.1f}%, RSS 峰值 {p['rss_peak_bytes'] / 1024 / 1024:.1f} MB")
+    if result["errors"]:
+        print(f"   错误      {result['errors']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="PPTist AI Backend 压测脚本")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", choices=["outline", "aippt", "data", "all"], default="all")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32, help="每个场景的请求总数")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--topic", default="人工智能在教育领域的应用")
+    parser.add_argument("--outline-file", help="用于 /tools/aippt 的大纲文件，默认使用内置示例")
+    parser.add_argument("--template", default="template_2")
+    parser.add_argument("--accept-encoding", default="gzip, br")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--server-pid", type=int, help="服务进程 PID，用于采集 CPU/内存")
+    parser.add_argument("--output", help="结果 JSON 文件路径，默认 bench/results/<时间>_<提交>.json")
+    args = parser.parse_args()
+
+    args.outline = SAMPLE_OUTLINE
+    if args.outline_file:
+        with open(args.outline_file, encoding="utf-8") as f:
+            args.outline = f.read()
+
+    scenarios = ["outline", "aippt", "data"] if args.scenario == "all" else [args.scenario]
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k != "outline"},
+        "scenarios": {},
+    }
+    for scenario in scenarios:
+        result = await run_scenario(scenario, args)
+        report["scenarios"][scenario] = result
+        print_report(result)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        f"{datetime.now():%Y%m%d-%H%M%S}_{commit}.json",
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+本地模拟 OpenAI 兼容流式接口
+
+根据提示词内容返回大纲、封面/目录页或章节页面，可配置首 token 延迟、
+token 速率和抖动，用于在不调用真实模型的情况下压测后端。
+请求带 response_format（结构化输出）时页面放在 {"pages": [...]} 中返回；
+--invalid-rate 按比例输出不合法的页面，用于测试单页重新生成。
+
+用法:
+    python bench/mock_openai.py --port 9000 --ttft 0.5 --tokens-per-sec 50
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=mock uv run main.py
+"""
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Mock OpenAI")
+options = argparse.Namespace(
+    ttft=0.5, tokens_per_sec=50.0, jitter=0.2, chars_per_token=2, chapters=4, sections=3, invalid_rate=0.0
+)
+
+
+def build_outline(topic: str) -> str:
+    lines = [f"# {topic}"]
+    for c in range(1, options.chapters + 1):
+        lines.append(f"## 第{c}章 {topic}的关键问题")
+        for s in range(1, options.sections + 1):
+            lines.append(f"### 第{c}.{s}节 核心要点")
+            for i in range(1, s + 2):
+                lines.append(f"- 要点{i}：围绕{topic}展开的具体说明")
+    return "\n".join(lines)
+
+
+def build_cover_contents(outline: str) -> str:
+    title = re.search(r"^# (.+)$", outline, re.M)
+    chapters = re.findall(r"^## (.+)$", outline, re.M)
+    pages = [
+        {"type": "cover", "data": {"title": title.group(1) if title else "演示文稿", "text": "自动生成的演示文稿"}},
+        {"type": "contents", "data": {"items": chapters or ["概述"]}},
+    ]
+    return "\n\n".join(json.dumps(p, ensure_ascii=False) for p in pages)
+
+
+def build_section(title: str, section_content: str) -> str:
+    sections = re.findall(r"^### (.+)$", section_content, re.M) or [title]
+    pages = [{"type": "transition", "data": {"title": title, "text": f"接下来介绍{title}"}}]
+    for section in sections:
+        pages.append({"type": "content", "data": {"title": section, "items": [
+            {"title": f"要点{i}", "text": f"{section}的第{i}个要点，这里是一段用于压测的示例说明文字。"}
+            for i in range(1, 4)
+        ]}})
+    return "\n\n".join(json.dumps(p, ensure_ascii=False) for p in pages)
+
+
+def build_chapter_group(prompt: str) -> str:
+    """多章节合并生成：每个页面带 chapter 标记"""
+    pages = []
+    blocks = re.split(r"^第\d+个章节$", prompt, flags=re.M)[1:]
+    for number, block in enumerate(blocks, start=1):
+        title = re.search(r"章节标题：(.*)", block)
+        content = block.split("章节内容：", 1)[-1]
+        for page in build_section(title.group(1).strip() if title else "章节", content).split("\n\n"):
+            pages.append(json.dumps({"chapter": number, **json.loads(page)}, ensure_ascii=False))
+    return "\n\n".join(pages)
+
+
+def build_repair(prompt: str) -> str:
+    """单页重新生成：按原页面的类型和标题返回一个合法页面"""
+    page = prompt.split("格式不合法的页面：", 1)[-1]
+    page_type = re.search(r'"type"\s*:\s*"(\w+)"', page)
+    title = re.search(r'"title"\s*:\s*"([^"]*)"', page)
+    title = title.group(1) if title else "演示文稿"
+    if page_type and page_type.group(1) == "cover":
+        return json.dumps({"type": "cover", "data": {"title": title, "text": "自动生成的演示文稿"}}, ensure_ascii=False)
+    if page_type and page_type.group(1) == "contents":
+        return json.dumps({"type": "contents", "data": {"items": [title]}}, ensure_ascii=False)
+    pages = build_section(title, "").split("\n\n")
+    return pages[0] if page_type and page_type.group(1) == "transition" else pages[1]
+
+
+def corrupt_pages(reply: str) -> str:
+    """按 --invalid-rate 把部分页面的 data 改成不合法的内容"""
+    pages = []
+    for page in reply.split("\n\n"):
+        if random.random() < options.invalid_rate:
+            data = json.loads(page)
+            data["data"] = {"title": data["data"].get("title", "")}
+            page = json.dumps(data, ensure_ascii=False)
+        pages.append(page)
+    return "\n\n".join(pages)
+
+
+def build_reply(prompt: str) -> str:
+    """根据提示词判断生成类型"""
+    if "格式不合法的页面" in prompt:
+        return build_repair(prompt)
+    if "章节结构" in prompt:
+        topic = re.search(r"这是生成要求：(.*)", prompt)
+        return build_outline(topic.group(1).strip() if topic else "测试主题")
+    if "封面页和目录页" in prompt:
+        outline = prompt.split("大纲内容：", 1)[-1]
+        return corrupt_pages(build_cover_contents(outline))
+    if "第1个章节" in prompt:
+        return corrupt_pages(build_chapter_group(prompt))
+    title = re.search(r"章节标题：(.*)", prompt)
+    content = prompt.split("章节内容：", 1)[-1]
+    return corrupt_pages(build_section(title.group(1).strip() if title else "章节", content))
+
+
+def tokenize(text: str):
+    step = max(1, options.chars_per_token)
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+async def jittered_sleep(seconds: float):
+    if seconds > 0:
+        await asyncio.sleep(seconds * random.uniform(1 - options.jitter, 1 + options.jitter))
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    reply = build_reply(prompt)
+    if body.get("response_format"):
+        pages = [json.loads(page) for page in reply.split("\n\n")]
+        reply = json.dumps({"pages": pages}, ensure_ascii=False)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await jittered_sleep(options.ttft + len(tokenize(reply)) / options.tokens_per_sec)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(tokenize(reply)), "total_tokens": len(prompt) + len(tokenize(reply))},
+        })
+
+    def frame(delta: dict, finish_reason=None) -> str:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    async def stream():
+        await jittered_sleep(options.ttft)
+        yield frame({"role": "assistant", "content": ""})
+        for token in tokenize(reply):
+            await jittered_sleep(1 / options.tokens_per_sec)
+            yield frame({"content": token})
+        yield frame({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI 兼容流式接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft", type=float, default=0.5, help="首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="每秒输出 token 数")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟抖动比例 (0~1)")
+    parser.add_argument("--chars-per-token", type=int, default=2, help="每个 token 包含的字符数")
+    parser.add_argument("--chapters", type=int, default=4, help="生成大纲的章节数")
+    parser.add_argument("--sections", type=int, default=3, help="每章的小节数")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="输出不合法页面的比例 (0~1)")
+    args = parser.parse_args()
+    vars(options).update(vars(args))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+章节合并调度模块
+
+较小的章节单独调用上游时，首 token 延迟和重复发送的提示词占了大部分开销。
+按预估的输出 token 数把相邻的小章节打包到一次调用中（每组不超过输出预算和章节数上限），
+较大的章节仍然单独生成；合并调用输出的页面带有 chapter 标记，用于还原各章节的页面顺序。
+"""
+from typing import List
+
+from tokens import estimate_tokens
+
+# 过渡页、内容页框架和每个内容条目的预估输出 token 数（条目正文不超过 100 字）
+TRANSITION_PAGE_TOKENS = 60
+CONTENT_PAGE_TOKENS = 40
+CONTENT_ITEM_TOKENS = 110
+
+
+def estimate_chapter_output_tokens(chapter: dict) -> int:
+    """预估生成一个章节（过渡页 + 每节一个内容页）的输出 token 数"""
+    tokens = TRANSITION_PAGE_TOKENS + estimate_tokens(chapter["title"])
+    for section in chapter["sections"]:
+        tokens += CONTENT_PAGE_TOKENS + estimate_tokens(section["title"])
+        tokens += CONTENT_ITEM_TOKENS * max(1, len(section["items"]))
+    return tokens
+
+
+def plan_chapter_groups(chapters: List[dict], max_output_tokens: int, max_chapters: int) -> List[List[int]]:
+    """把相邻章节按输出预算贪心分组，返回每组的章节下标；超出预算的章节单独成组"""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, chapter in enumerate(chapters):
+        tokens = estimate_chapter_output_tokens(chapter)
+        if current and (current_tokens + tokens > max_output_tokens or len(current) >= max_chapters):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def contiguous_runs(indices: List[int]) -> List[List[int]]:
+    """把递增的下标列表拆分为连续区间，例如 [0, 1, 3, 4, 6] → [[0, 1], [3, 4], [6]]"""
+    runs: List[List[int]] = []
+    for index in indices:
+        if runs and runs[-1][-1] + 1 == index:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
+
+
+def format_chapter_group(chapter_texts: List[tuple]) -> str:
+    """把 (章节标题, 章节大纲) 列表排成合并调用的请求内容，章节序号从 1 开始"""
+    blocks = []
+    for number, (title, content) in enumerate(chapter_texts, start=1):
+        blocks.append(f"第{number}个章节\n章节标题：{title}\n章节内容：\n{content}")
+    return "\n".join(blocks)
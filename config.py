@@ -17,9 +17,121 @@ class Settings:
         self.host: str = os.getenv("HOST", "0.0.0.0")
         self.port: int = int(os.getenv("PORT", "8000"))
         self.debug: bool = os.getenv("DEBUG", "false").lower() == "true"
+        # 生产部署：工作进程数、事件循环（auto/asyncio/uvloop）和 HTTP 解析器（auto/h11/httptools）
+        self.workers: int = int(os.getenv("WORKERS", "1"))
+        self.server_loop: str = os.getenv("SERVER_LOOP", "auto").lower()
+        self.server_http: str = os.getenv("SERVER_HTTP", "auto").lower()
+        self.server_backlog: int = int(os.getenv("SERVER_BACKLOG", "2048"))
+        self.keepalive_timeout: int = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+        # 关闭时等待进行中的生成流和后台任务完成的最长时间（秒）
+        self.graceful_shutdown_timeout: float = float(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "60"))
+        # 工作进程负载文件目录，为空时只上报本进程（WORKERS > 1 时自动使用临时目录）
+        self.worker_state_dir: str = os.getenv("WORKER_STATE_DIR", "")
+        self.worker_load_interval: float = float(os.getenv("WORKER_LOAD_INTERVAL", "2"))
+        # 章节并发生成配置
+        self.concurrent_generation: bool = os.getenv("CONCURRENT_GENERATION", "true").lower() == "true"
+        self.max_concurrent_chapters: int = int(os.getenv("MAX_CONCURRENT_CHAPTERS", "4"))
+        # 上游连接池配置
+        self.llm_max_connections: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+        self.llm_max_keepalive_connections: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.llm_keepalive_expiry: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+        self.llm_connect_timeout: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+        self.llm_read_timeout: float = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+        self.llm_http2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+        # 生成结果缓存配置
+        self.response_cache_enabled: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+        self.response_cache_backend: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+        self.response_cache_path: str = os.getenv("RESPONSE_CACHE_PATH", "cache/response_cache.sqlite3")
+        self.response_cache_max_entries: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+        self.response_cache_ttl: float = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+        # 按章节内容寻址的页面缓存，修改部分章节后只重新生成改动的章节
+        self.chapter_cache_enabled: bool = os.getenv("CHAPTER_CACHE_ENABLED", "false").lower() == "true"
+        self.chapter_cache_backend: str = os.getenv("CHAPTER_CACHE_BACKEND", "memory").lower()
+        self.chapter_cache_path: str = os.getenv("CHAPTER_CACHE_PATH", "cache/chapter_cache.sqlite3")
+        self.chapter_cache_max_entries: int = int(os.getenv("CHAPTER_CACHE_MAX_ENTRIES", "5000"))
+        self.chapter_cache_ttl: float = float(os.getenv("CHAPTER_CACHE_TTL", "604800"))
+        # 大纲生成完成后在后台预先生成各章节页面（写入章节页面缓存）
+        self.speculative_content: bool = os.getenv("SPECULATIVE_CONTENT", "false").lower() == "true"
+        # 合并相同的进行中请求
+        self.single_flight_enabled: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+        # 准入控制与上游限流配置（RPM/TPM 为 0 表示不限制）
+        self.max_active_streams: int = int(os.getenv("MAX_ACTIVE_STREAMS", "32"))
+        self.admission_queue_size: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+        self.max_upstream_concurrency: int = int(os.getenv("MAX_UPSTREAM_CONCURRENCY", "64"))
+        self.max_upstream_concurrency_per_model: int = int(os.getenv("MAX_UPSTREAM_CONCURRENCY_PER_MODEL", "32"))
+        self.upstream_rpm: float = float(os.getenv("UPSTREAM_RPM", "0"))
+        self.upstream_tpm: float = float(os.getenv("UPSTREAM_TPM", "0"))
+        self.expected_output_tokens: int = int(os.getenv("EXPECTED_OUTPUT_TOKENS", "800"))
+        # 上游容错配置
+        # 备用端点，格式: base_url|model|api_key，多个用逗号分隔；model/api_key 留空则与主端点相同
+        self.upstream_fallbacks: str = os.getenv("UPSTREAM_FALLBACKS", "")
+        self.chain_max_retries: int = int(os.getenv("CHAIN_MAX_RETRIES", "2"))
+        self.retry_backoff_base: float = float(os.getenv("RETRY_BACKOFF_BASE", "0.5"))
+        self.retry_backoff_max: float = float(os.getenv("RETRY_BACKOFF_MAX", "8"))
+        self.hedge_enabled: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+        self.hedge_min_delay: float = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+        # 多章节合并生成配置（相邻的小章节合并为一次上游调用）
+        self.chapter_batching: bool = os.getenv("CHAPTER_BATCHING", "false").lower() == "true"
+        self.chapter_batch_max_output_tokens: int = int(os.getenv("CHAPTER_BATCH_MAX_OUTPUT_TOKENS", "1500"))
+        self.chapter_batch_max_chapters: int = int(os.getenv("CHAPTER_BATCH_MAX_CHAPTERS", "4"))
+        # 封面/目录页输入的大纲 token 预算（超出时只保留章节标题）
+        self.cover_outline_max_tokens: int = int(os.getenv("COVER_OUTLINE_MAX_TOKENS", "600"))
+        # 流式输出配置（STREAM_FORMAT: raw 兼容 PPTist 前端，sse 输出带 id/event 的 SSE 事件）
+        self.stream_format: str = os.getenv("STREAM_FORMAT", "raw").lower()
+        self.sse_heartbeat_interval: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+        self.disconnect_poll_interval: float = float(os.getenv("DISCONNECT_POLL_INTERVAL", "1.0"))
+        # 流式输出合并：缓冲达到字节数或等待超过秒数时输出（延迟为 0 不合并）
+        self.stream_coalesce_bytes: int = int(os.getenv("STREAM_COALESCE_BYTES", "512"))
+        self.stream_coalesce_delay: float = float(os.getenv("STREAM_COALESCE_DELAY", "0.03"))
+        # 流式响应压缩：off、auto（按 Accept-Encoding 优先 br）、br 或 gzip
+        self.stream_compression: str = os.getenv("STREAM_COMPRESSION", "off").lower()
+        # 批量生成配置
+        self.batch_max_decks: int = int(os.getenv("BATCH_MAX_DECKS", "100"))
+        self.batch_max_concurrency: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+        # 后台生成任务配置（JOB_STORE_PATH 为空时仅保存在内存中）
+        self.job_max_jobs: int = int(os.getenv("JOB_MAX_JOBS", "256"))
+        self.job_grace_period: float = float(os.getenv("JOB_GRACE_PERIOD", "120"))
+        self.job_store_path: str = os.getenv("JOB_STORE_PATH", "")
+        # 指标与追踪配置
+        self.metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self.otel_enabled: bool = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+        # 模板文件配置
+        self.template_dir: str = os.getenv("TEMPLATE_DIR", "template")
+        self.preload_templates: bool = os.getenv("PRELOAD_TEMPLATES", "true").lower() == "true"
+        # 多进程共享的模板映射文件目录，为空时每个进程各自缓存
+        self.template_shared_dir: str = os.getenv("TEMPLATE_SHARED_DIR", "")
+        # 启动模式：warm 在启动时加载 LangChain、编译提示词并构建生成链；lazy 在首次请求时加载
+        self.startup_mode: str = os.getenv("STARTUP_MODE", "warm").lower()
+        # 启动预热时是否预先建立到上游端点的连接
+        self.warmup_connect: bool = os.getenv("WARMUP_CONNECT", "true").lower() == "true"
+        # 生成后端：openai（OpenAI 兼容接口）、replay（重放录制的 token 流）或 template（本地模板生成）
+        self.generation_backend: str = os.getenv("GENERATION_BACKEND", "openai").lower()
+        # template 后端的输出速率（0 为无延迟）和每个分块的字符数
+        self.backend_tokens_per_sec: float = float(os.getenv("BACKEND_TOKENS_PER_SEC", "0"))
+        self.backend_chunk_chars: int = int(os.getenv("BACKEND_CHUNK_CHARS", "4"))
+        # openai 后端录制 token 流的 JSONL 文件，为空则不录制
+        self.record_path: str = os.getenv("RECORD_PATH", "")
+        # replay 后端读取的录制文件和重放倍速（0 为无延迟）
+        self.replay_path: str = os.getenv("REPLAY_PATH", "cache/recordings.jsonl")
+        self.replay_speed: float = float(os.getenv("REPLAY_SPEED", "1.0"))
+        # 上游全部失败时使用本地模板生成降级内容
+        self.degraded_fallback: bool = os.getenv("DEGRADED_FALLBACK", "false").lower() == "true"
+        # 页面生成方式：off 为逐行输出 JSON 页面，json_schema 使用服务商的结构化输出
+        self.structured_output: str = os.getenv("STRUCTURED_OUTPUT", "off").lower()
+        # 页面不合法时单独重新生成该页的次数（0 为直接丢弃）
+        self.page_repair_attempts: int = int(os.getenv("PAGE_REPAIR_ATTEMPTS", "1"))
+    
+    @property
+    def resolved_backend(self) -> str:
+        """实际使用的生成后端（未知的 GENERATION_BACKEND 按 openai 处理）"""
+        from backends import BACKENDS
+        return self.generation_backend if self.generation_backend in BACKENDS else "openai"
     
     def validate(self) -> bool:
-        """验证配置是否有效"""
+        """验证配置是否有效（本地生成后端不需要 API Key）"""
+        if self.resolved_backend != "openai":
+            return True
         if not self.openai_api_key:
             return False
         if self.openai_api_key == "your-openai-api-key-here":
@@ -34,6 +146,22 @@ class Settings:
             "openai_api_key": self.openai_api_key,
             "openai_api_base": self.openai_base_url
         }
+    
+    def get_upstream_endpoints(self, model_name: Optional[str] = None) -> list:
+        """获取主端点和备用端点的模型配置列表，主端点在前"""
+        endpoints = [self.get_model_config(model_name)]
+        for entry in self.upstream_fallbacks.split(","):
+            if not entry.strip():
+                continue
+            base_url, _, rest = entry.strip().partition("|")
+            model, _, api_key = rest.partition("|")
+            endpoints.append({
+                "model": model.strip() or endpoints[0]["model"],
+                "temperature": self.default_temperature,
+                "openai_api_key": api_key.strip() or self.openai_api_key,
+                "openai_api_base": base_url.strip()
+            })
+        return endpoints
 
 
 # 全局配置实例
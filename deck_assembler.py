@@ -0,0 +1,246 @@
+"""
+服务端幻灯片组装模块
+
+把生成的抽象页面（cover / contents / transition / content / end）按类型和
+条目数匹配到模板幻灯片，替换其中的文本元素，输出可直接渲染的 PPTist 幻灯片，
+逻辑与 PPTist 前端的 AIPPT 填充过程一致：
+
+- 目录页和内容页按条目数选择模板，条目过多时拆分为多页；
+- 多余的条目元素（及其所在的组合）会被删除；
+- 文本按元素宽度和最大行数缩小字号。
+"""
+import re
+import json
+import random
+import secrets
+import logging
+from html import escape
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional
+
+from template_store import SlideInfo, TemplateEntry, text_type
+
+logger = logging.getLogger(__name__)
+
+PAGE_TYPES = ("cover", "contents", "transition", "content", "end")
+FONT_SIZE_PATTERN = re.compile(r"font-size:\s*([\d.]+)px")
+MIN_FONT_SIZE = 12
+
+
+class _TextReplacer(HTMLParser):
+    """把 HTML 中第一个文本节点替换为新文本，删除其余文本节点"""
+
+    def __init__(self, text: str):
+        super().__init__(convert_charrefs=True)
+        self.text = text
+        self.replaced = False
+        self.parts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        self.parts.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        self.parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.replaced and data.strip():
+            self.parts.append(escape(self.text, quote=False))
+            self.replaced = True
+
+
+def text_width(text: str, font_size: float) -> float:
+    """估算单行文本宽度：中日韩及全角字符按一个字号计，其余按半个字号计"""
+    return sum(font_size if ord(ch) > 0x2E80 else font_size * 0.55 for ch in text)
+
+
+def fit_font_size(text: str, width: float, font_size: float, max_line: int) -> float:
+    """在最大行数内放下文本所需的字号（只缩小不放大）"""
+    size = font_size
+    while size > MIN_FONT_SIZE and text_width(text, size) > width * max_line:
+        size -= 1
+    return size
+
+
+def replace_text(content: str, text: str, width: float, max_line: int, longest_text: Optional[str] = None) -> str:
+    """替换富文本内容并按宽度调整字号；longest_text 用于让同组条目使用相同字号"""
+    replacer = _TextReplacer(text)
+    replacer.feed(content)
+    replacer.close()
+    html = "".join(replacer.parts)
+    if not replacer.replaced:
+        html = f"<p>{escape(text, quote=False)}</p>"
+    match = FONT_SIZE_PATTERN.search(html)
+    if match:
+        font_size = float(match.group(1))
+        size = fit_font_size(longest_text or text, width, font_size, max_line)
+        if size < font_size:
+            html = FONT_SIZE_PATTERN.sub(f"font-size: {size:g}px", html)
+    return html
+
+
+def set_text(element: dict, text: str, max_line: int, longest_text: Optional[str] = None) -> dict:
+    """替换文本元素或形状内文本"""
+    # 与 PPTist 一致，扣除左右内边距和边框
+    width = element.get("width", 0) - 22
+    if element.get("type") == "text":
+        element["content"] = replace_text(element.get("content", ""), text, width, max_line, longest_text)
+    elif element.get("text"):
+        element["text"]["content"] = replace_text(element["text"].get("content", ""), text, width, max_line, longest_text)
+    return element
+
+
+def reading_order(elements: List[dict]) -> List[dict]:
+    """按阅读顺序（先上后下、先左后右）排列条目元素"""
+    return sorted(elements, key=lambda e: e.get("left", 0) + e.get("top", 0) * 2)
+
+
+def split_items(items: list, max_items: int) -> List[list]:
+    """条目超过模板容量时均匀拆分为多组，例如 5 → 3+2，7 → 4+3，9 → 3+3+3"""
+    if len(items) <= max_items:
+        return [items]
+    groups = -(-len(items) // max_items)
+    size, extra = divmod(len(items), groups)
+    result, start = [], 0
+    for i in range(groups):
+        end = start + size + (1 if i < extra else 0)
+        result.append(items[start:end])
+        start = end
+    return result
+
+
+def new_slide_id() -> str:
+    return secrets.token_urlsafe(8)[:10]
+
+
+class DeckAssembler:
+    """把一份 PPT 的页面依次填充到同一模板的幻灯片中"""
+
+    def __init__(self, entry: TemplateEntry, seed: Optional[int] = None):
+        self.entry = entry
+        self.random = random.Random(seed)
+        self.by_type: Dict[str, List[SlideInfo]] = {}
+        for info in entry.slides:
+            self.by_type.setdefault(info.type, []).append(info)
+        # 与前端一致，整份 PPT 使用同一个过渡页模板
+        transitions = self.by_type.get("transition")
+        self.transition = self.random.choice(transitions) if transitions else None
+        self.transition_count = 0
+
+    def _candidates(self, page_type: str, count: Optional[int] = None) -> List[SlideInfo]:
+        """按类型选择模板；指定条目数时选择容量不小于且最接近的模板"""
+        slides = self.by_type.get(page_type, [])
+        if count is None or not slides:
+            return slides
+        fitting = [info for info in slides if info.items >= count]
+        target = min(info.items for info in fitting) if fitting else max(info.items for info in slides)
+        return [info for info in slides if info.items == target]
+
+    def max_items(self, page_type: str) -> int:
+        return max((info.items for info in self.by_type.get(page_type, [])), default=0)
+
+    def _load(self, info: SlideInfo) -> dict:
+        slide = self.entry.load_slide(info.index)
+        slide["id"] = new_slide_id()
+        return slide
+
+    def assemble(self, page: dict) -> List[dict]:
+        """把一个页面填充为一张或多张幻灯片；模板中没有对应类型时返回空列表"""
+        page_type = page.get("type")
+        data = page.get("data") or {}
+        if page_type in ("contents", "content"):
+            items = data.get("items") or []
+            max_items = self.max_items(page_type)
+            if max_items <= 0:
+                return []
+            slides, offset = [], 0
+            for group in split_items(items, max_items):
+                slides.append(self._fill_items(page_type, {**data, "items": group}, offset))
+                offset += len(group)
+            return slides
+        if page_type == "transition":
+            if self.transition is None:
+                return []
+            self.transition_count += 1
+            return [self._fill_simple(self._load(self.transition), data, self.transition_count)]
+        candidates = self._candidates(page_type)
+        if not candidates:
+            return []
+        return [self._fill_simple(self._load(self.random.choice(candidates)), data)]
+
+    @staticmethod
+    def _fill_simple(slide: dict, data: dict, part_number: Optional[int] = None) -> dict:
+        """封面页、过渡页和结束页：替换标题、正文和章节序号"""
+        for element in slide.get("elements", []):
+            kind = text_type(element)
+            if kind == "title" and data.get("title"):
+                set_text(element, data["title"], 1)
+            elif kind == "content" and data.get("text"):
+                set_text(element, data["text"], 3)
+            elif kind == "partNumber" and part_number is not None:
+                set_text(element, f"{part_number:02d}", 1)
+        return slide
+
+    def _fill_items(self, page_type: str, data: dict, offset: int) -> dict:
+        """目录页和内容页：按阅读顺序替换条目，删除多余的条目元素"""
+        items = data["items"]
+        slide = self._load(self.random.choice(self._candidates(page_type, len(items))))
+        elements = slide.get("elements", [])
+        order = {}
+        for kind in ("item", "itemTitle", "itemNumber"):
+            for index, element in enumerate(reading_order([e for e in elements if text_type(e) == kind])):
+                order[element.get("id")] = index
+
+        # 目录页条目为字符串，内容页条目为 {title, text}
+        titles = [item if isinstance(item, str) else item.get("title", "") for item in items]
+        texts = [item.get("text", "") if isinstance(item, dict) else "" for item in items]
+        longest_title = max(titles, key=len, default="")
+        longest_text = max(texts, key=len, default="")
+
+        unused_ids, unused_groups = set(), set()
+        for element in elements:
+            kind = text_type(element)
+            if kind == "title" and data.get("title"):
+                set_text(element, data["title"], 1)
+                continue
+            if kind not in ("item", "itemTitle", "itemNumber"):
+                continue
+            index = order[element.get("id")]
+            if index >= len(items):
+                unused_ids.add(element.get("id"))
+                if element.get("groupId"):
+                    unused_groups.add(element["groupId"])
+            elif kind == "itemNumber":
+                set_text(element, f"{offset + index + 1:02d}", 1)
+            elif page_type == "contents":
+                set_text(element, titles[index], 1, longest_title)
+            elif kind == "itemTitle":
+                set_text(element, titles[index], 1, longest_title)
+            else:
+                set_text(element, texts[index], 4, longest_text)
+
+        slide["elements"] = [
+            e for e in elements
+            if e.get("id") not in unused_ids and not (e.get("groupId") and e["groupId"] in unused_groups)
+        ]
+        return slide
+
+
+async def assemble_stream(stream: AsyncIterator[str], assembler: DeckAssembler) -> AsyncIterator[str]:
+    """把页面流转换为幻灯片流，排队提示和错误信息原样透传"""
+    try:
+        async for chunk in stream:
+            try:
+                page = json.loads(chunk)
+            except ValueError:
+                yield chunk
+                continue
+            if not isinstance(page, dict) or page.get("type") not in PAGE_TYPES:
+                yield chunk
+                continue
+            for slide in assembler.assemble(page):
+                yield json.dumps(slide, ensure_ascii=False) + "\n\n"
+    finally:
+        await stream.aclose()
@@ -0,0 +1,247 @@
+"""
+可恢复的后台生成任务
+
+生成以带 ID 的服务端任务运行，页面产生后即保存（内存中保留最近的任务，
+可选写入 SQLite），客户端断线后可通过 Last-Event-ID / 页码重新连接，
+只接收缺失的页面。客户端全部断开后任务继续运行一段宽限期，期间无人重连才取消。
+"""
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """一个后台生成任务"""
+
+    def __init__(self, job_id: str, store: "JobStore"):
+        self.id = job_id
+        self.store = store
+        self.status = RUNNING
+        self.error: Optional[str] = None
+        self.pages: List[str] = []
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.subscribers = 0
+        self._condition = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._grace_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status != RUNNING
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "pages": len(self.pages),
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    async def _run(self, factory: Callable[[], AsyncIterator[str]]):
+        source = factory()
+        try:
+            async for page in source:
+                page = page.strip()
+                if not page:
+                    continue
+                async with self._condition:
+                    self.pages.append(page)
+                    self.updated_at = time.time()
+                    self._condition.notify_all()
+                await self.store._save_page(self, len(self.pages) - 1, page)
+            await self._finish(COMPLETED)
+        except asyncio.CancelledError:
+            await self._finish(CANCELLED, "任务已取消")
+            raise
+        except Exception as e:
+            logger.error(f"🧾 任务 {self.id} 失败: {str(e)}")
+            await self._finish(FAILED, str(e))
+        finally:
+            await source.aclose()
+
+    async def _finish(self, status: str, error: Optional[str] = None):
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+        async with self._condition:
+            self.status = status
+            self.error = error
+            self.updated_at = time.time()
+            self._condition.notify_all()
+        await self.store._save_job(self)
+        logger.info(f"🧾 任务 {self.id} 结束: {status}, 共 {len(self.pages)} 页")
+
+    def _start_grace_timer(self):
+        if self.finished or self._task is None or self._grace_timer is not None:
+            return
+        self._grace_timer = asyncio.get_running_loop().call_later(
+            self.store.grace_period, self._cancel_if_idle
+        )
+
+    def _cancel_if_idle(self):
+        self._grace_timer = None
+        if self.subscribers == 0 and not self.finished:
+            logger.info(f"🧾 任务 {self.id} 无客户端重连，取消生成")
+            self._task.cancel()
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """从第 start 页（从 0 开始）开始订阅，返回 (页码, 页面)，任务结束后停止"""
+        self.subscribers += 1
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+        index = max(0, start)
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(lambda: index < len(self.pages) or self.finished)
+                    pending = self.pages[index:]
+                    finished = self.finished
+                for page in pending:
+                    yield index, page
+                    index += 1
+                if finished and index >= len(self.pages):
+                    break
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self._start_grace_timer()
+
+
+class JobStore:
+    """后台任务存储：内存中按创建顺序保留最近的任务，可选 SQLite 持久化页面"""
+
+    def __init__(self, max_jobs: int, grace_period: float, sqlite_path: Optional[str] = None):
+        self.max_jobs = max_jobs
+        self.grace_period = grace_period
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._conn = None
+        self._lock = threading.Lock()
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_pages ("
+                "job_id TEXT NOT NULL, idx INTEGER NOT NULL, page TEXT NOT NULL, "
+                "PRIMARY KEY (job_id, idx))"
+            )
+            self._conn.commit()
+
+    async def create(self, factory: Callable[[], AsyncIterator[str]]) -> Job:
+        """创建并启动任务；创建后无人订阅同样在宽限期后取消"""
+        job = Job(uuid.uuid4().hex, self)
+        self._jobs[job.id] = job
+        self._evict()
+        await self._save_job(job)
+        job._task = asyncio.create_task(job._run(factory))
+        job._start_grace_timer()
+        logger.info(f"🧾 创建生成任务: {job.id}")
+        return job
+
+    def _evict(self):
+        """超出容量时优先淘汰最早结束的任务"""
+        while len(self._jobs) > self.max_jobs:
+            victim = next((j for j in self._jobs.values() if j.finished), None)
+            if victim is None:
+                break
+            del self._jobs[victim.id]
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self._conn is not None:
+            job = await asyncio.to_thread(self._load, job_id)
+        return job
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        """从 SQLite 恢复任务（只读，未完成的任务视为已取消）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, error, created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            pages = [r[0] for r in self._conn.execute(
+                "SELECT page FROM job_pages WHERE job_id = ? ORDER BY idx", (job_id,)
+            )]
+        job = Job(job_id, self)
+        job.status = row[0] if row[0] != RUNNING else CANCELLED
+        job.error = row[1] if row[0] != RUNNING else "服务重启，任务已中断"
+        job.created_at, job.updated_at = row[2], row[3]
+        job.pages = pages
+        return job
+
+    async def _save_page(self, job: Job, index: int, page: str):
+        if self._conn is None:
+            return
+
+        def save():
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO job_pages VALUES (?, ?, ?)", (job.id, index, page)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE job_id = ?", (job.updated_at, job.id)
+                )
+                self._conn.commit()
+
+        await asyncio.to_thread(save)
+
+    async def _save_job(self, job: Job):
+        if self._conn is None:
+            return
+
+        def save():
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+                    (job.id, job.status, job.error, job.created_at, job.updated_at),
+                )
+                self._conn.commit()
+
+        await asyncio.to_thread(save)
+
+    @property
+    def running_count(self) -> int:
+        return sum(1 for j in self._jobs.values() if not j.finished)
+
+    async def drain(self, timeout: float):
+        """等待仍在运行的任务完成，最多等待 timeout 秒"""
+        tasks = [j._task for j in self._jobs.values() if j._task is not None and not j._task.done()]
+        if tasks and timeout > 0:
+            logger.info(f"🧾 等待 {len(tasks)} 个后台任务完成（最多 {timeout:.0f} 秒）")
+            await asyncio.wait(tasks, timeout=timeout)
+
+    async def aclose(self):
+        """关闭时取消所有仍在运行的任务"""
+        tasks = [j._task for j in self._jobs.values() if j._task is not None and not j._task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,130 @@
+"""
+LLM 客户端注册表
+
+进程内共享同一个调优过的异步 HTTP 连接池，并按
+(链名称, 模型, base_url, temperature, 是否结构化输出) 缓存已构建的生成链，
+避免每个请求都重新创建 ChatOpenAI 和连接池。
+
+langchain_openai 导入较慢，只在首次构建生成链（或启动预热）时导入。
+"""
+import logging
+import importlib.util
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRegistry:
+    """进程级的生成链注册表"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._llms: Dict[Tuple[str, str, float, str], "ChatOpenAI"] = {}
+        self._chains: Dict[Tuple[str, str, str, float, str, bool], object] = {}
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """共享的异步 HTTP 连接池（首次使用时创建）"""
+        if self._http_client is None or self._http_client.is_closed:
+            http2 = self.settings.llm_http2 and importlib.util.find_spec("h2") is not None
+            self._http_client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self.settings.llm_max_connections,
+                    max_keepalive_connections=self.settings.llm_max_keepalive_connections,
+                    keepalive_expiry=self.settings.llm_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    self.settings.llm_read_timeout,
+                    connect=self.settings.llm_connect_timeout,
+                ),
+            )
+            logger.info(
+                f"🔌 创建上游连接池 (HTTP/2: {http2}, "
+                f"最大连接数: {self.settings.llm_max_connections})"
+            )
+        return self._http_client
+
+    @staticmethod
+    def warm_up():
+        """提前导入 LangChain 模块"""
+        import langchain_openai  # noqa: F401
+        import langchain_core.output_parsers  # noqa: F401
+
+    async def connect(self, endpoints: List[dict], timeout: float = 5.0):
+        """预先建立到各上游端点的连接，连接失败只记录警告"""
+        for endpoint in endpoints:
+            url = endpoint["openai_api_base"].rstrip("/") + "/models"
+            try:
+                await self.http_client.get(
+                    url,
+                    headers={"Authorization": f"Bearer {endpoint['openai_api_key']}"},
+                    timeout=timeout,
+                )
+                logger.info(f"🔌 已连接上游: {endpoint['openai_api_base']}")
+            except Exception as e:
+                logger.warning(f"⚠️ 预连接上游失败: {endpoint['openai_api_base']} - {str(e)}")
+
+    def get_llm(self, model_config: dict) -> "ChatOpenAI":
+        """按 (模型, base_url, temperature, API Key) 获取共享的 ChatOpenAI 实例"""
+        from langchain_openai import ChatOpenAI
+
+        key = (
+            model_config["model"],
+            model_config["openai_api_base"],
+            model_config["temperature"],
+            model_config["openai_api_key"],
+        )
+        llm = self._llms.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                temperature=model_config["temperature"],
+                model=model_config["model"],
+                openai_api_key=model_config["openai_api_key"],
+                openai_api_base=model_config["openai_api_base"],
+                http_async_client=self.http_client,
+                # 不传 timeout 时 OpenAI SDK 会以 None 覆盖连接池上配置的超时；
+                # 重试和端点切换由 ResilientChain 负责，SDK 不再自行重试
+                timeout=httpx.Timeout(
+                    self.settings.llm_read_timeout,
+                    connect=self.settings.llm_connect_timeout,
+                ),
+                max_retries=0,
+            )
+            self._llms[key] = llm
+        return llm
+
+    def get_chain(self, name: str, prompt, model_config: dict, response_format: dict = None):
+        """获取 prompt | llm | StrOutputParser 生成链，同一配置只构建一次
+
+        传入 response_format 时以结构化输出（JSON Schema）方式调用，流式返回的仍是 JSON 文本。
+        """
+        key = (
+            name,
+            model_config["model"],
+            model_config["openai_api_base"],
+            model_config["temperature"],
+            model_config["openai_api_key"],
+            response_format is not None,
+        )
+        chain = self._chains.get(key)
+        if chain is None:
+            from langchain_core.output_parsers import StrOutputParser
+            llm = self.get_llm(model_config)
+            if response_format is not None:
+                llm = llm.bind(response_format=response_format)
+            chain = prompt | llm | StrOutputParser()
+            self._chains[key] = chain
+        return chain
+
+    async def aclose(self):
+        """关闭共享连接池并清空缓存的生成链"""
+        self._chains.clear()
+        self._llms.clear()
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+            logger.info("🔌 上游连接池已关闭")
+        self._http_client = None
@@ -1,15 +1,41 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, Field
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from typing import List, Optional
 import os
+import re
 import json
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from config import settings
+from template_store import TemplateFragment, TemplateStore, accepted_encodings, etag_matches
+from backends import DegradedChain, TemplateBackend, create_generation_backend, degraded_since, mark_degraded
+from response_cache import create_chapter_cache, create_response_cache, prompt_version, replay_chunks
+from singleflight import SingleFlight
+from admission import AdmissionController, AdmissionRejected, AdmittedChain
+from resilience import EndpointHealth, ResilientChain, retry_delay
+from jobs import FAILED, JobStore
+from sse import ClosingStreamingResponse, format_event, sse_events, watch_disconnect
+from stream_output import choose_encoding, output_stream
+from page_parser import PageExtractor, ParsedPage
+from page_models import page_list_schema
+from prompts import PromptUsage, build_prompt, outline_headings
+from chapter_groups import contiguous_runs, format_chapter_group, plan_chapter_groups
+from deck_assembler import DeckAssembler, assemble_stream
+from startup import StartupTracker
+from serving import DrainMiddleware, DrainState, WorkerLoadReporter, summarize_load
+from outline_parser import OutlineParser, parse_outline
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from metrics import (
+    INVALID_PAGES, PAGE_EMIT_LATENCY, PAGE_REPAIRS, TEMPLATE_RESPONSE,
+    InstrumentedChain, open_stream_count, setup_tracing, track_active_stream
+)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -26,12 +52,141 @@ if not settings.validate():
 else:
     logger.info(f"✅ 配置验证通过 (模型: {settings.default_model})")
 
+# 模板文件缓存
+template_store = TemplateStore(settings.template_dir, settings.template_shared_dir or None)
+
+# 生成后端（默认为共享连接池的 OpenAI 兼容接口）
+generation_backend = create_generation_backend(settings)
+
+# 上游全部失败时的降级生成后端
+degraded_backend = (
+    TemplateBackend(chunk_chars=settings.backend_chunk_chars)
+    if settings.degraded_fallback and settings.resolved_backend == "openai" else None
+)
+
+# 生成结果缓存（默认关闭）
+response_cache = create_response_cache(settings)
+
+# 按章节内容寻址的页面缓存（默认关闭）
+chapter_cache = create_chapter_cache(settings)
+
+# 大纲完成后在后台预生成章节页面的任务
+speculative_tasks = set()
+
+# 可选的 OpenTelemetry 追踪
+setup_tracing(settings.otel_enabled)
+
+# 合并相同的进行中生成请求
+single_flight = SingleFlight(settings.single_flight_enabled)
+
+# 生成流准入和上游调用限流
+admission = AdmissionController(settings)
+
+# 上游端点健康统计，用于故障转移和对冲请求
+endpoint_health = EndpointHealth()
+
+# 可断线重连的后台生成任务
+job_store = JobStore(settings.job_max_jobs, settings.job_grace_period, settings.job_store_path or None)
+
+# 启动阶段计时和就绪状态
+startup = StartupTracker(_import_started)
+
+# 关闭时的排空状态
+drain = DrainState(settings.graceful_shutdown_timeout)
+
+
+def worker_snapshot() -> dict:
+    """本工作进程的当前负载"""
+    return {
+        "open_streams": open_stream_count(),
+        "active_streams": admission.active_streams,
+        "queued_streams": admission.queued_streams,
+        "max_active_streams": admission.max_active_streams,
+        "running_jobs": job_store.running_count,
+        "draining": drain.draining,
+    }
+
+
+# 工作进程负载上报（多进程部署时汇总同一实例所有工作进程）
+worker_load = WorkerLoadReporter(settings.worker_state_dir, settings.worker_load_interval, worker_snapshot)
+
+
+async def warm_up():
+    """预热：加载 LangChain、编译提示词并构建默认模型的生成链、预连接上游"""
+    with startup.phase("langchain_import"):
+        await asyncio.to_thread(generation_backend.warm_up)
+    with startup.phase("prompt_compile"):
+        for prompt in (outline_prompt, cover_contents_prompt, section_content_prompt, chapter_group_prompt):
+            prompt.compile()
+    if not settings.validate():
+        logger.warning("⚠️ 配置无效，跳过生成链预构建和上游预连接")
+        return
+    with startup.phase("chain_build"):
+        for builder in (build_outline_chain, build_cover_contents_chain, build_section_content_chain,
+                        build_chapter_group_chain):
+            builder()
+    if settings.warmup_connect:
+        with startup.phase("upstream_connect"):
+            await generation_backend.connect(settings.get_upstream_endpoints())
+
+
+async def preload_templates():
+    """后台预加载模板（brotli 预压缩较慢，不阻塞就绪）"""
+    with startup.phase("template_preload"):
+        await template_store.preload()
+
+
+async def start_up():
+    """后台启动流程：预热完成后标记就绪，再开始预加载模板
+
+    服务器在 lifespan 启动阶段结束后才开始接受连接，预热放在后台任务中，
+    预热期间 /health 即可访问，/health/ready 返回 503。
+    """
+    if settings.startup_mode == "warm":
+        try:
+            await warm_up()
+        except Exception as e:
+            logger.warning(f"⚠️ 启动预热失败，将在首次请求时加载: {str(e)}")
+    startup.mark_ready()
+    # 预热完成后再开始预加载，避免压缩线程与模块导入争用 GIL
+    if settings.preload_templates:
+        await preload_templates()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动后在后台预热并预加载模板；关闭时先等待后台任务在排空截止时间内完成，
+    再取消剩余任务并释放上游连接池"""
+    startup.record("import", time.perf_counter() - _import_started)
+    drain.install_signal_handlers()
+    load_task = asyncio.create_task(worker_load.run())
+    startup_task = asyncio.create_task(start_up())
+    yield
+    # 服务器已在排空期内等待进行中的流式响应结束，剩余时间留给后台任务
+    drain.start()
+    await job_store.drain(drain.remaining())
+    load_task.cancel()
+    await asyncio.gather(load_task, return_exceptions=True)
+    if not startup_task.done():
+        startup_task.cancel()
+        await asyncio.gather(startup_task, return_exceptions=True)
+    for task in list(speculative_tasks):
+        task.cancel()
+    await asyncio.gather(*speculative_tasks, return_exceptions=True)
+    await job_store.aclose()
+    await generation_backend.aclose()
+
+
 app = FastAPI(
     title="PPTist AI Backend",
     description="AI-powered PPT generation backend using LangChain and FastAPI",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+# 排空期间拒绝新的生成请求（在 CORS 中间件内层，503 响应同样带 CORS 头）
+app.add_middleware(DrainMiddleware, drain=drain)
+
 # 配置 CORS 允许的源
 allowed_origins = [
     "http://localhost:3000",  # React 开发服务器
@@ -81,7 +236,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "message": "请求参数验证失败",
             "help": {
                 "/tools/aippt_outline": "需要参数: model, language, content",
-                "/tools/aippt": "需要参数: model, language, content"
+                "/tools/aippt": "需要参数: model, language, content",
+                "/tools/aippt_deck": "需要参数: model, language, content"
             }
         }
     )
@@ -89,7 +245,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 router = APIRouter()
 
 # PPT大纲生成模板
-outline_template = """你是用户的PPT大纲生成助手，请根据下列主题生成章节结构。
+# 静态指令作为可缓存的前缀放在 system 消息中，请求变量放在最后的 human 消息中
+outline_instructions = """你是用户的PPT大纲生成助手，请根据下列主题生成章节结构。
 
 注意事项：
 - 节可以有2~6个，最多10个
@@ -112,15 +269,16 @@ outline_template = """你是用户的PPT大纲生成助手，请根据下列主
 - xxxxx
 - xxxxx
 - xxxxx
+"""
 
-这是生成要求：{content}
+outline_request = """这是生成要求：{content}
 这是生成的语言要求：{language}
 """
 
-outline_prompt = PromptTemplate.from_template(outline_template)
+outline_prompt = build_prompt(outline_instructions, outline_request)
 
 # PPT封面页和目录页生成模板
-cover_contents_template = """
+cover_contents_instructions = """
 你是一个专业的PPT内容生成助手，请根据给定的大纲内容，生成封面页和目录页的JSON内容。
 
 输出格式要求如下：
@@ -138,17 +296,18 @@ cover_contents_template = """
 {{"type": "cover", "data": {{ "title": "接口相关内容介绍", "text": "了解接口定义、设计与实现要点" }}}}
 
 {{"type": "contents", "data": {{ "items": ["接口定义概述", "接口分类详情", "接口设计原则"] }}}}
+"""
 
-请根据以下信息生成封面页和目录页：
+cover_contents_request = """请根据以下信息生成封面页和目录页：
 
 语言：{language}
 大纲内容：{content}
 """
 
-cover_contents_prompt = PromptTemplate.from_template(cover_contents_template)
+cover_contents_prompt = build_prompt(cover_contents_instructions, cover_contents_request)
 
 # PPT章节内容生成模板
-section_content_template = """
+section_content_instructions = """
 你是一个专业的PPT内容生成助手，请根据给定的章节信息，生成该章节的过渡页和内容页的JSON内容。
 
 输出格式要求如下：
@@ -167,107 +326,520 @@ section_content_template = """
 {{"type": "transition", "data": {{ "title": "接口定义", "text": "开始介绍接口的基本含义" }}}}
 
 {{"type": "content", "data": {{ "title": "接口定义", "items": [ {{ "title": "基本概念", "text": "接口定义了一组方法的契约或规范，但不提供具体实现。它好比一个“蓝图”，规定了实现它的类必须具备哪些功能。" }}, {{ "title": "作用", "text": "接口的主要作用是实现多态和松耦合。它让不同类型的对象能以统一的方式被处理，提高了代码的灵活性、可扩展性和复用性。通过接口，系统各部分之间的依赖性降低，更易于维护和升级。" }} ] }}}}
+"""
 
-请根据以下信息生成章节内容：
+section_content_request = """请根据以下信息生成章节内容：
 
 语言：{language}
 章节标题：{section_title}
 章节内容：{section_content}
 """
 
-section_content_prompt = PromptTemplate.from_template(section_content_template)
+section_content_prompt = build_prompt(section_content_instructions, section_content_request)
 
+# 多章节合并生成模板（页面带 chapter 标记，用于还原各章节的页面顺序）
+chapter_group_instructions = """
+你是一个专业的PPT内容生成助手，请根据给定的多个章节信息，依次生成每个章节的过渡页和内容页的JSON内容。
 
+输出格式要求如下：
+- 每一页为一个独立 JSON 对象
+- 每个 JSON 对象写在**同一行**
+- 页面之间用两个换行符分隔
+- 每个 JSON 对象必须包含 "chapter" 字段，值为该页所属章节的序号（从 1 开始）
+- 按章节顺序输出，一个章节的页面全部输出后再输出下一个章节
+- 不要添加任何注释或解释说明
 
-def build_outline_chain(model_name: str = None):
-    """构建PPT大纲生成链"""
+注意事项：
+- 为每个章节生成一个过渡页("transition")
+- 为章节下的每个节生成一个内容页("content")
+- 每个text的内容可以尽量丰富，但是不应该超过100字
+
+示例格式（注意每个 JSON 占一行）：
+
+{{"chapter": 1, "type": "transition", "data": {{ "title": "接口定义", "text": "开始介绍接口的基本含义" }}}}
+
+{{"chapter": 1, "type": "content", "data": {{ "title": "接口定义", "items": [ {{ "title": "基本概念", "text": "接口定义了一组方法的契约或规范，但不提供具体实现。" }}, {{ "title": "作用", "text": "接口的主要作用是实现多态和松耦合，提高代码的灵活性和可扩展性。" }} ] }}}}
+
+{{"chapter": 2, "type": "transition", "data": {{ "title": "接口设计", "text": "介绍接口设计的基本原则" }}}}
+"""
+
+chapter_group_request = """请根据以下信息依次生成各章节内容：
+
+语言：{language}
+{chapters}
+"""
+
+chapter_group_prompt = build_prompt(chapter_group_instructions, chapter_group_request)
+
+# 单页重新生成模板（页面 JSON 不合法时只重新请求这一页）
+page_repair_instructions = """
+你是一个专业的PPT内容生成助手。下面这一页PPT的JSON内容格式不合法，请根据页面所属的内容和错误信息重新生成这一页。
+
+输出格式要求如下：
+- 只输出重新生成的这一页，为一个 JSON 对象，写在**同一行**
+- 页面类型("type")与原页面保持一致
+- 每个text的内容可以尽量丰富，但是不应该超过100字
+- 不要添加任何注释或解释说明
+
+各类型页面的格式：
+
+{{"type": "cover", "data": {{ "title": "封面标题", "text": "封面介绍" }}}}
+
+{{"type": "contents", "data": {{ "items": ["章节1", "章节2"] }}}}
+
+{{"type": "transition", "data": {{ "title": "章节标题", "text": "章节介绍" }}}}
+
+{{"type": "content", "data": {{ "title": "节标题", "items": [ {{ "title": "要点标题", "text": "要点内容" }} ] }}}}
+"""
+
+page_repair_request = """语言：{language}
+页面所属内容：
+{context}
+
+格式不合法的页面：
+{page}
+
+错误信息：{error}
+"""
+
+page_repair_prompt = build_prompt(page_repair_instructions, page_repair_request)
+
+# 结构化输出模式（STRUCTURED_OUTPUT=json_schema）：页面放在 {"pages": [...]} 中，
+# 按页面模型生成 JSON Schema 交给服务商约束输出；值为 (页面类型, 是否带 chapter 标记)
+STRUCTURED_PAGE_TYPES = {
+    "cover_contents": (("cover", "contents"), False),
+    "section_content": (("transition", "content"), False),
+    "chapter_group": (("transition", "content"), True),
+    "page_repair": (("cover", "contents", "transition", "content"), False),
+}
+
+structured_output_instructions = """
+结构化输出：
+- 输出一个 JSON 对象，所有页面按顺序放在 "pages" 数组中，不需要按行和空行分隔
+- 每个页面的结构与上面的示例一致
+"""
+
+structured_prompts = {
+    prompt: build_prompt(prompt.instructions + structured_output_instructions, prompt.request)
+    for prompt in (cover_contents_prompt, section_content_prompt, chapter_group_prompt, page_repair_prompt)
+}
+
+# 不合法页面原文最多带入重新生成请求的字符数
+PAGE_REPAIR_MAX_CHARS = 4000
+
+# 提示词模板版本，用于生成结果缓存的键
+OUTLINE_PROMPT_VERSION = prompt_version(outline_instructions, outline_request)
+CONTENT_PROMPT_VERSION = prompt_version(
+    cover_contents_instructions, cover_contents_request,
+    section_content_instructions, section_content_request,
+    chapter_group_instructions, chapter_group_request,
+    str(settings.cover_outline_max_tokens)
+)
+
+
+def structured_output_enabled() -> bool:
+    return settings.structured_output == "json_schema"
+
+
+
+def page_response_format(name: str) -> Optional[dict]:
+    """结构化输出模式下页面生成链的 response_format，其他情况为 None"""
+    if not structured_output_enabled() or name not in STRUCTURED_PAGE_TYPES:
+        return None
+    page_types, tagged = STRUCTURED_PAGE_TYPES[name]
+    return {"type": "json_schema", "json_schema": page_list_schema(page_types, tagged)}
+
+
+def _build_chain(name: str, prompt, model_name: str = None):
+    """获取共享的生成链，并加上准入限流、多端点容错和指标统计"""
     if not settings.validate():
         raise HTTPException(status_code=500, detail="OpenAI API Key 未配置")
     
-    model_config = settings.get_model_config(model_name)
-    llm = ChatOpenAI(
-        temperature=model_config["temperature"],
-        model=model_config["model"],
-        openai_api_key=model_config["openai_api_key"],
-        openai_api_base=model_config["openai_api_base"]
-    )
-    return outline_prompt | llm | StrOutputParser()
+    endpoints = settings.get_upstream_endpoints(model_name)
+    if settings.resolved_backend != "openai":
+        # 本地后端不需要备用端点
+        endpoints = endpoints[:1]
+    response_format = page_response_format(name)
+    if response_format is not None:
+        prompt = structured_prompts[prompt]
+    chains = [
+        AdmittedChain(
+            admission, endpoint["model"], prompt,
+            generation_backend.get_chain(name, prompt, endpoint, response_format)
+        )
+        for endpoint in endpoints
+    ]
+    chain = ResilientChain(endpoints, chains, endpoint_health, settings)
+    if degraded_backend is not None and name not in STRUCTURED_PAGE_TYPES:
+        # 页面生成链由 stream_parsed_pages 按章节重试，重试耗尽后才降级
+        fallback = degraded_backend.get_chain(name, prompt, endpoints[0], response_format)
+        chain = DegradedChain(name, chain, fallback)
+    return InstrumentedChain(name, endpoints[0]["model"], prompt, chain)
+
+
+def degraded_chain(chain):
+    """页面生成链重试耗尽后改用的本地模板生成链；未开启降级生成时为 None"""
+    if degraded_backend is None:
+        return None
+    endpoint = settings.get_upstream_endpoints(chain.model)[0]
+    return degraded_backend.get_chain(chain.name, chain.prompt, endpoint, page_response_format(chain.name))
+
+
+def build_outline_chain(model_name: str = None):
+    """构建PPT大纲生成链"""
+    return _build_chain("outline", outline_prompt, model_name)
 
 
 def build_cover_contents_chain(model_name: str = None):
     """构建封面页和目录页生成链"""
-    if not settings.validate():
-        raise HTTPException(status_code=500, detail="OpenAI API Key 未配置")
-    
-    model_config = settings.get_model_config(model_name)
-    llm = ChatOpenAI(
-        temperature=model_config["temperature"],
-        model=model_config["model"],
-        openai_api_key=model_config["openai_api_key"],
-        openai_api_base=model_config["openai_api_base"]
-    )
-    return cover_contents_prompt | llm | StrOutputParser()
+    return _build_chain("cover_contents", cover_contents_prompt, model_name)
 
 
 def build_section_content_chain(model_name: str = None):
     """构建章节内容生成链"""
-    if not settings.validate():
-        raise HTTPException(status_code=500, detail="OpenAI API Key 未配置")
+    return _build_chain("section_content", section_content_prompt, model_name)
+
+
+def build_chapter_group_chain(model_name: str = None):
+    """构建多章节合并生成链"""
+    return _build_chain("chapter_group", chapter_group_prompt, model_name)
+
+
+def build_page_repair_chain(model_name: str = None):
+    """构建单页重新生成链"""
+    return _build_chain("page_repair", page_repair_prompt, model_name)
+
+
+def admit_stream(key: str = None):
+    """申请生成流名额；相同请求正在进行时会被合并，无需占用新名额
+    
+    等待队列已满时直接返回 429，而不是在生成途中失败。
+    """
+    if key is not None and single_flight.is_inflight(key):
+        return None
+    try:
+        return admission.admit()
+    except AdmissionRejected as e:
+        logger.warning(f"🚦 等待队列已满，拒绝请求 (建议 {e.retry_after} 秒后重试)")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def classify_chunk(chunk: str):
+    """按 JSON 内容确定 SSE 事件名：流水线事件沿用其 event 字段，其余为 page / queue / error"""
+    data = chunk.strip()
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return "message", data
+    if "event" in payload:
+        return payload["event"], data
+    if "error" in payload:
+        return "error", data
+    if payload.get("type") == "queue":
+        return "queue", data
+    return "page", data
+
+
+def output_stage(http_request: Request, endpoint: str, body, coalesce: bool = True) -> tuple:
+    """流式响应的输出阶段：合并小分块、按 Accept-Encoding 压缩，返回 (响应体, 额外响应头)"""
+    encoding = choose_encoding(http_request.headers.get("accept-encoding"), settings.stream_compression)
+    body = output_stream(
+        endpoint, body, settings.stream_coalesce_bytes,
+        settings.stream_coalesce_delay if coalesce else 0, encoding
+    )
+    headers = {"Content-Encoding": encoding, "Vary": "Accept-Encoding"} if encoding else {}
+    return body, headers
+
+
+def stream_response(
+    http_request: Request, endpoint: str, stream, classify=classify_chunk, headers: dict = None,
+    raw_frames: bool = False, ticket=None
+) -> StreamingResponse:
+    """构建流式响应
     
-    model_config = settings.get_model_config(model_name)
-    llm = ChatOpenAI(
-        temperature=model_config["temperature"],
-        model=model_config["model"],
-        openai_api_key=model_config["openai_api_key"],
-        openai_api_base=model_config["openai_api_base"]
+    默认按原有格式输出（兼容 PPTist 前端），STREAM_FORMAT=sse 或 ?format=sse 时
+    输出带 id/event 的 SSE 事件和心跳；两种模式下客户端断开都会立即取消生成。
+    raw_frames 表示原有格式下每个分块是一个完整页面（PPTist 前端按分块解析），此时不合并分块。
+    ticket 为本请求申请的准入凭证，响应结束时若生成流从未开始则释放名额。
+    """
+    sse = http_request.query_params.get("format", settings.stream_format) == "sse"
+    if sse:
+        body = watch_disconnect(
+            http_request, sse_events(stream, classify),
+            settings.disconnect_poll_interval, settings.sse_heartbeat_interval
+        )
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})}
+    else:
+        body = watch_disconnect(http_request, stream, settings.disconnect_poll_interval)
+    body, output_headers = output_stage(http_request, endpoint, body, coalesce=sse or not raw_frames)
+    return ClosingStreamingResponse(
+        track_active_stream(endpoint, body),
+        media_type="text/event-stream",
+        headers={**(headers or {}), **output_headers},
+        on_close=ticket.release_unclaimed if ticket is not None else None
     )
-    return section_content_prompt | llm | StrOutputParser()
 
 
+def format_chapter(chapter: dict) -> str:
+    """将解析后的章节还原为 Markdown 大纲文本"""
+    section_content = f"## {chapter['title']}\n"
+    for section in chapter['sections']:
+        section_content += f"### {section['title']}\n"
+        for item in section['items']:
+            section_content += f"- {item}\n"
+    return section_content
+
+
+def page_level() -> int:
+    """页面对象的嵌套层数：结构化输出时页面位于 {"pages": [...]} 中"""
+    return 1 if structured_output_enabled() else 0
 
 
-def parse_outline(content: str) -> dict:
-    """解析大纲内容，提取标题和章节信息"""
-    lines = content.strip().split('\n')
-    result = {
-        'title': '',
-        'chapters': []
+def emit_page(page: ParsedPage) -> ParsedPage:
+    logger.debug(f"页面解析完成: {page.data['type']} (耗时 {page.latency * 1000:.1f}ms)")
+    PAGE_EMIT_LATENCY.labels(page.data['type']).observe(page.latency)
+    return page
+
+
+async def repair_page(chain, inputs: dict, page: ParsedPage) -> Optional[ParsedPage]:
+    """只重新请求一个不合法的页面，最多 PAGE_REPAIR_ATTEMPTS 次；仍不合法时返回 None（丢弃该页）"""
+    repair_inputs = {
+        "language": inputs.get("language", ""),
+        "context": "\n".join(str(value) for key, value in inputs.items() if key != "language"),
+        "page": page.text[:PAGE_REPAIR_MAX_CHARS],
+        "error": page.error,
     }
+    # 合并调用的页面带 chapter 标记，重新生成的页面沿用原页面的标记
+    chapter = re.search(r'"chapter"\s*:\s*(\d+)', page.text)
+    for attempt in range(settings.page_repair_attempts):
+        extractor = PageExtractor(page_level())
+        pages = []
+        try:
+            repair_chain = build_page_repair_chain(getattr(chain, "model", None))
+            async for chunk in repair_chain.astream(repair_inputs):
+                pages.extend(extractor.feed(chunk))
+            extractor.close()
+        except Exception as e:
+            logger.warning(f"⚠️ 重新生成页面失败 (第 {attempt + 1} 次): {str(e)}")
+            continue
+        if pages:
+            data = dict(pages[0].data)
+            if chapter is not None and data.get("type") in ("transition", "content"):
+                data.setdefault("chapter", int(chapter.group(1)))
+            PAGE_REPAIRS.labels("repaired").inc()
+            logger.info(f"🩹 已重新生成不合法的页面: {data['type']}")
+            return ParsedPage(data=data, text=json.dumps(data, ensure_ascii=False), latency=page.latency)
+    PAGE_REPAIRS.labels("failed").inc()
+    logger.warning(f"⚠️ 页面重新生成后仍不合法，已丢弃: {page.text[:200]}")
+    return None
+
+
+async def stream_parsed_pages(chain, inputs: dict):
+    """流式调用生成链，增量解析出完整且合法的页面并逐页返回
     
-    current_chapter = None
-    current_section = None
+    调用中途失败时按退避时间重新生成本次内容，已经输出过的页面不会重复输出；
+    重试耗尽且开启了降级生成时，剩余页面改用本地模板生成。
+    出现不合法的页面时只单独重新生成这一页：为了不在占用上游并发名额时再申请名额，
+    该页及其后的页面先暂存，本次调用结束后再按原顺序修复并输出。
+    """
+    delivered = 0
+    repair = settings.page_repair_attempts > 0
+    source = chain
+    attempt = 0
+    while True:
+        extractor = PageExtractor(page_level(), keep_invalid=repair)
+        produced = 0
+        held = []
+        try:
+            async for chunk in source.astream(inputs):
+                for page in extractor.feed(chunk):
+                    produced += 1
+                    if produced <= delivered:
+                        continue
+                    delivered += 1
+                    if held or page.data is None:
+                        held.append(page)
+                        continue
+                    yield emit_page(page)
+            unclosed = extractor.close()
+            if unclosed is not None and produced + 1 > delivered:
+                delivered += 1
+                held.append(unclosed)
+            for page in held:
+                if page.data is None:
+                    page = await repair_page(chain, inputs, page)
+                    if page is None:
+                        continue
+                yield emit_page(page)
+            break
+        except Exception as e:
+            # 暂存而未输出的页面在重试时重新生成
+            delivered -= len(held)
+            if attempt >= settings.chain_max_retries:
+                fallback = degraded_chain(chain) if source is chain else None
+                if fallback is None:
+                    raise
+                mark_degraded(chain.name, e)
+                source = fallback
+                continue
+            delay = retry_delay(attempt, settings.retry_backoff_base, settings.retry_backoff_max)
+            logger.warning(
+                f"🔁 生成中断（已输出 {delivered} 页），{delay:.2f}s 后第 {attempt + 1} 次重试: {str(e)}"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+        finally:
+            INVALID_PAGES.inc(extractor.invalid_count)
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        if line.startswith('# '):  # PPT标题
-            result['title'] = line[2:].strip()
-        elif line.startswith('## '):  # 章节标题
-            if current_chapter:
-                result['chapters'].append(current_chapter)
-            current_chapter = {
-                'title': line[3:].strip(),
-                'sections': []
-            }
-            current_section = None
-        elif line.startswith('### '):  # 节标题
-            if current_chapter:
-                current_section = {
-                    'title': line[4:].strip(),
-                    'items': []
-                }
-                current_chapter['sections'].append(current_section)
-        elif line.startswith('- '):  # 内容项
-            if current_section:
-                current_section['items'].append(line[2:].strip())
+    if extractor.parse_latencies:
+        avg_latency = sum(extractor.parse_latencies) / len(extractor.parse_latencies)
+        logger.info(
+            f"🧩 页面解析: 有效 {extractor.page_count} 页, 不合法 {extractor.invalid_count} 页, "
+            f"平均解析耗时 {avg_latency * 1000:.1f}ms"
+        )
+
+
+async def stream_chain_pages(chain, inputs: dict):
+    """流式调用生成链，逐页返回以 "\n\n" 结尾的页面 JSON 文本"""
+    async for page in stream_parsed_pages(chain, inputs):
+        yield page.text + "\n\n"
+
+
+async def stream_chapter_group_pages(chain, inputs: dict, group_size: int):
+    """多章节合并调用：按页面的 chapter 标记逐章节顺序输出 (组内章节下标, 页面)，并去掉标记
     
-    # 添加最后一个章节
-    if current_chapter:
-        result['chapters'].append(current_chapter)
+    后一章节的页面出现时认为当前章节已经结束；提前出现的更后面章节的页面先缓存，
+    轮到该章节时再输出，保证页面顺序与逐章节生成一致。已经结束的章节再出现的页面直接丢弃。
+    """
+    buffers = [[] for _ in range(group_size)]
+    current = 0
+    async for page in stream_parsed_pages(chain, inputs):
+        data = dict(page.data)
+        tag = data.pop("chapter", None)
+        index = tag - 1 if isinstance(tag, int) and 1 <= tag <= group_size else current
+        if index < current:
+            logger.warning(f"⚠️ 第 {index + 1} 章已经结束，丢弃乱序出现的页面: {page.text[:200]}")
+            continue
+        text = json.dumps(data, ensure_ascii=False) + "\n\n"
+        if index == current:
+            yield index, text
+        elif index == current + 1:
+            current = index
+            for buffered in buffers[current]:
+                yield current, buffered
+            buffers[current] = []
+            yield index, text
+        else:
+            buffers[index].append(text)
+    for index in range(current + 1, group_size):
+        for buffered in buffers[index]:
+            yield index, buffered
+
+
+def cover_unit(request) -> tuple:
+    """封面/目录页的生成输入和章节页面缓存键（只需要大纲的标题结构）"""
+    inputs = {
+        "language": request.language,
+        "content": outline_headings(request.content, settings.cover_outline_max_tokens)
+    }
+    key = chapter_cache.make_key(
+        "cover_contents", request.model, request.language, inputs["content"], CONTENT_PROMPT_VERSION
+    )
+    return inputs, key
+
+
+def chapter_unit(request, chapter: dict) -> tuple:
+    """单个章节的生成输入和章节页面缓存键"""
+    inputs = {
+        "language": request.language,
+        "section_title": chapter['title'],
+        "section_content": format_chapter(chapter)
+    }
+    key = chapter_cache.make_key(
+        "section_content", request.model, request.language, inputs["section_content"], CONTENT_PROMPT_VERSION
+    )
+    return inputs, key
+
+
+async def cache_set(cache, key: str, chunks: List[str], started: float):
+    """写入缓存；生成期间有调用改用了降级内容时不写入，上游恢复后重新生成"""
+    if degraded_since(started):
+        logger.info("🩹 本次生成包含降级内容，不写入缓存")
+        return
+    await cache.set(key, chunks)
+
+
+async def store_pages(stream, key: str):
+    """转发页面，完整生成后写入章节页面缓存"""
+    pages = []
+    started = time.monotonic()
+    try:
+        async for page in stream:
+            pages.append(page)
+            yield page
+        if pages:
+            await cache_set(chapter_cache, key, pages, started)
+    finally:
+        await stream.aclose()
+
+
+async def store_group_pages(stream, keys: List[str]):
+    """转发多章节合并调用的页面，完整生成后按章节分别写入章节页面缓存"""
+    pages = [[] for _ in keys]
+    started = time.monotonic()
+    try:
+        async for index, page in stream:
+            pages[index].append(page)
+            yield page
+        for key, chapter_pages in zip(keys, pages):
+            if chapter_pages:
+                await cache_set(chapter_cache, key, chapter_pages, started)
+    finally:
+        await stream.aclose()
+
+
+def shared_chapter_stream(keys: List[str], factory):
+    """相同章节正在其他请求（或预生成任务）中生成时，订阅同一个上游流"""
+    return single_flight.stream("chapter:" + ",".join(keys), factory)
+
+
+async def merge_in_order(factories: list, max_concurrency: int):
+    """并发运行多个页面流，并按原始顺序输出 (源序号, 页面)
     
-    return result
+    排在最前面的流的页面一旦生成即刻输出，其余流的页面先缓存，
+    轮到该流时再依次输出。
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    queues = [asyncio.Queue() for _ in factories]
+    done = object()
+
+    async def produce(factory, queue: asyncio.Queue):
+        try:
+            async with semaphore:
+                async for page in factory():
+                    queue.put_nowait(page)
+            queue.put_nowait(done)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    tasks = [
+        asyncio.create_task(produce(factory, queue))
+        for factory, queue in zip(factories, queues)
+    ]
+    try:
+        for source_idx, queue in enumerate(queues):
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield source_idx, item
+    finally:
+        # 客户端断开或出错时取消仍在运行的生成任务
+        for task in tasks:
+            if not task.done():
+                task.cancel()
 
 
 # 请求模型定义
@@ -283,14 +855,31 @@ class PPTContentRequest(BaseModel):
     language: str = Field(..., description="生成内容的语言，例如 中文、English")
     content: str = Field(..., description="PPT大纲内容")
     stream: bool = True
+    template: str = Field(None, description="模板名称（如 template_1），指定后在服务端填充模板并返回 PPTist 幻灯片")
+
+
+def token_event(chunk: str):
+    """大纲 token 原样作为 token 事件输出，出错时为 error 事件"""
+    if chunk.startswith("错误: "):
+        return "error", chunk
+    return "token", chunk
 
 
 # 路由实现
 @router.post("/tools/aippt_outline")
-async def generate_ppt_outline_stream(request: PPTOutlineRequest):
+async def generate_ppt_outline_stream(request: PPTOutlineRequest, http_request: Request):
     """生成PPT大纲（流式返回）"""
     logger.info(f"📝 收到大纲生成请求: 模型={request.model}, 语言={request.language}, 要求={request.content}")
     
+    # 检查生成结果缓存
+    cache_key = response_cache.make_key(
+        "aippt_outline", request.model, request.language, request.content, OUTLINE_PROMPT_VERSION
+    )
+    cached_chunks = await response_cache.get(cache_key)
+    if cached_chunks is not None:
+        logger.info("🗄️ 大纲命中缓存")
+        return stream_response(http_request, "aippt_outline", replay_chunks(cached_chunks), token_event)
+    
     try:
         chain = build_outline_chain(request.model)
     except HTTPException as e:
@@ -301,38 +890,433 @@ async def generate_ppt_outline_stream(request: PPTOutlineRequest):
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
     async def token_stream():
+        chunks = []
+        started = time.monotonic()
         try:
             logger.info("开始生成PPT大纲...")
             async for chunk in chain.astream({
                 "content": request.content,
                 "language": request.language
             }):
+                chunks.append(chunk)
                 yield chunk
             logger.info("PPT大纲生成完成")
+            await cache_set(response_cache, cache_key, chunks, started)
+            schedule_speculative_content(request, "".join(chunks))
         except Exception as e:
             error_msg = f"生成过程中出错: {str(e)}"
             logger.error(error_msg)
             yield f"错误: {error_msg}"
 
-    return StreamingResponse(token_stream(), media_type="text/event-stream")
+    ticket = admit_stream(cache_key)
+    return stream_response(http_request, "aippt_outline", single_flight.stream(
+        cache_key, lambda: admission.stream(ticket, token_stream)
+    ), token_event, ticket=ticket)
 
 
-@router.post("/tools/aippt")
-async def generate_ppt_content_stream(request: PPTContentRequest):
-    """生成PPT内容（分步骤流式返回）"""
-    logger.info(f"📄 收到内容生成请求: 模型={request.model}, 语言={request.language}")
-    logger.info(f"📄 大纲内容长度: {len(request.content)} 字符")
+def schedule_speculative_content(request: PPTOutlineRequest, outline: str):
+    """大纲生成完成后在后台预先生成封面/目录和各章节页面，写入章节页面缓存
     
-    # 解析大纲
+    用户确认（或只修改部分章节）后提交内容生成时，已预生成的章节直接从缓存输出，
+    仍在预生成中的章节会订阅同一个上游流，不会重复调用。
+    """
+    if not settings.speculative_content or not chapter_cache.enabled:
+        return
+    try:
+        outline_data = parse_outline(outline)
+    except Exception as e:
+        logger.warning(f"🔮 大纲解析失败，跳过预生成: {str(e)}")
+        return
+    content_request = PPTContentRequest(model=request.model, language=request.language, content=outline)
+
+    async def run():
+        pages = None
+        try:
+            pages = generate_deck_pages(content_request, outline_data, *build_content_chains(request.model))
+            async for _ in pages:
+                pass
+            logger.info(f"🔮 预生成完成: {outline_data['title']}")
+        except Exception as e:
+            logger.warning(f"🔮 预生成失败: {str(e)}")
+        finally:
+            if pages is not None:
+                await pages.aclose()
+
+    logger.info(f"🔮 开始预生成章节页面: {outline_data['title']}")
+    task = asyncio.create_task(run())
+    speculative_tasks.add(task)
+    task.add_done_callback(speculative_tasks.discard)
+
+
+def parse_content_outline(request: PPTContentRequest) -> dict:
+    """解析内容生成请求中的大纲"""
     try:
         outline_data = parse_outline(request.content)
         logger.info(f"📄 解析大纲成功: 标题={outline_data['title']}, 章节数={len(outline_data['chapters'])}")
+        return outline_data
     except Exception as e:
         logger.error(f"解析大纲失败: {str(e)}")
         raise HTTPException(status_code=400, detail="大纲格式解析失败")
+
+
+def build_content_chains(model_name: str):
+    """构建封面/目录页、章节内容和多章节合并生成链"""
+    try:
+        return (
+            build_cover_contents_chain(model_name),
+            build_section_content_chain(model_name),
+            build_chapter_group_chain(model_name),
+        )
+    except HTTPException as e:
+        logger.error(f"构建生成链失败: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"构建生成链异常: {str(e)}")
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+
+async def generate_deck_pages(
+    request: PPTContentRequest, outline_data: dict, cover_contents_chain, section_content_chain, chapter_group_chain=None
+):
+    """按 封面/目录 → 各章节 → 结束页 的顺序生成整套页面，逐页返回页面文本"""
+    page_count = 0
+    usage = PromptUsage()
+    
+    # 封面/目录页与各章节页的生成任务，按输出顺序排列；章节页面缓存中已有的部分直接重放
+    cover_inputs, cover_key = cover_unit(request)
+    cover_pages = await chapter_cache.get(cover_key)
+    if cover_pages is not None:
+        sources = [("封面/目录（已缓存）", lambda: replay_chunks(cover_pages))]
+    else:
+        usage.record_trim(request.content, cover_inputs["content"])
+        usage.record(cover_contents_prompt, cover_inputs)
+        sources = [("封面/目录", lambda: shared_chapter_stream(
+            [cover_key], lambda: store_pages(stream_chain_pages(cover_contents_chain, cover_inputs), cover_key)
+        ))]
+    
+    chapters = outline_data['chapters']
+    units = [chapter_unit(request, chapter) for chapter in chapters]
+    stored = [await chapter_cache.get(key) for _, key in units]
+    misses = [chapter_idx for chapter_idx, pages in enumerate(stored) if pages is None]
+    if len(misses) < len(chapters):
+        logger.info(f"♻️ 复用 {len(chapters) - len(misses)}/{len(chapters)} 个章节的已生成页面")
+    
+    # 只合并相邻的待生成章节，保证输出顺序
+    groups = [[chapter_idx] for chapter_idx, pages in enumerate(stored) if pages is not None]
+    for run in contiguous_runs(misses):
+        if settings.chapter_batching and chapter_group_chain is not None:
+            planned = plan_chapter_groups(
+                [chapters[i] for i in run], settings.chapter_batch_max_output_tokens, settings.chapter_batch_max_chapters
+            )
+            groups.extend([run[i] for i in group] for group in planned)
+        else:
+            groups.extend([chapter_idx] for chapter_idx in run)
+    groups.sort()
+    if settings.chapter_batching and chapter_group_chain is not None and misses:
+        calls = [len(group) for group in groups if stored[group[0]] is None]
+        logger.info(f"📦 {len(misses)} 个章节合并为 {len(calls)} 次调用: {calls}")
+    
+    for group in groups:
+        if stored[group[0]] is not None:
+            sources.append((
+                f"第{group[0] + 1}章（已缓存）",
+                lambda pages=stored[group[0]]: replay_chunks(pages)
+            ))
+        elif len(group) == 1:
+            section_inputs, key = units[group[0]]
+            usage.record(section_content_prompt, section_inputs)
+            sources.append((
+                f"第{group[0] + 1}章",
+                lambda inputs=section_inputs, key=key: shared_chapter_stream(
+                    [key], lambda: store_pages(stream_chain_pages(section_content_chain, inputs), key)
+                )
+            ))
+        else:
+            group_inputs = {
+                "language": request.language,
+                "chapters": format_chapter_group(
+                    [(chapters[i]['title'], format_chapter(chapters[i])) for i in group]
+                )
+            }
+            usage.record(chapter_group_prompt, group_inputs)
+            sources.append((
+                f"第{group[0] + 1}-{group[-1] + 1}章",
+                lambda inputs=group_inputs, keys=[units[i][1] for i in group]: shared_chapter_stream(
+                    keys, lambda: store_group_pages(
+                        stream_chapter_group_pages(chapter_group_chain, inputs, len(keys)), keys
+                    )
+                )
+            ))
+    usage.log()
+    
+    if settings.concurrent_generation:
+        # 并发模式：所有生成任务同时启动，按顺序输出
+        logger.info(f"⚡ 并发生成 {len(sources)} 个任务 (并发上限: {settings.max_concurrent_chapters})")
+        page_stream = merge_in_order(
+            [factory for _, factory in sources],
+            settings.max_concurrent_chapters
+        )
+        async for source_idx, page in page_stream:
+            page_count += 1
+            logger.debug(f"生成第 {page_count} 页内容（{sources[source_idx][0]}）")
+            yield page
+    else:
+        # 顺序模式：逐个生成封面/目录页和各章节页
+        for label, factory in sources:
+            logger.info(f"📖 开始生成{label}...")
+            async for page in factory():
+                page_count += 1
+                logger.debug(f"生成第 {page_count} 页内容（{label}）")
+                yield page
+    
+    # 生成结束页
+    logger.info("🎬 开始生成结束页...")
+    page_count += 1
+    logger.debug(f"生成第 {page_count} 页内容（结束页）")
+    yield '{"type": "end"}'
+    
+    logger.info(f"PPT内容生成完成，总共生成 {page_count} 页")
+
+
+async def build_assembler(template: str = None):
+    """请求指定模板时创建服务端幻灯片组装器"""
+    if not template:
+        return None
+    entry = await load_template(template)
+    if not entry.slides:
+        raise HTTPException(status_code=400, detail=f"模板 {template}.json 不包含可用的幻灯片")
+    logger.info(f"🧩 使用模板 {template}.json 在服务端组装幻灯片")
+    return DeckAssembler(entry)
+
+
+def assembled(stream, assembler):
+    """有组装器时把页面流转换为幻灯片流"""
+    return stream if assembler is None else assemble_stream(stream, assembler)
+
+
+def queue_hint(position: int) -> str:
+    """页面流中的排队提示"""
+    return json.dumps({"type": "queue", "data": {"position": position}}) + "\n\n"
+
+
+@router.post("/tools/aippt")
+async def generate_ppt_content_stream(request: PPTContentRequest, http_request: Request):
+    """生成PPT内容（分步骤流式返回）"""
+    logger.info(f"📄 收到内容生成请求: 模型={request.model}, 语言={request.language}")
+    logger.info(f"📄 大纲内容长度: {len(request.content)} 字符")
+    
+    # 解析大纲
+    outline_data = parse_content_outline(request)
+    assembler = await build_assembler(request.template)
+    
+    # 检查生成结果缓存
+    cache_key = response_cache.make_key(
+        "aippt", request.model, request.language, request.content, CONTENT_PROMPT_VERSION
+    )
+    cached_pages = await response_cache.get(cache_key)
+    if cached_pages is not None:
+        logger.info(f"🗄️ PPT内容命中缓存，共 {len(cached_pages)} 页")
+        return stream_response(
+            http_request, "aippt", assembled(replay_chunks(cached_pages), assembler), raw_frames=True
+        )
+    
+    # 构建生成链
+    cover_contents_chain, section_content_chain, chapter_group_chain = build_content_chains(request.model)
+    
+    async def structured_page_stream():
+        pages = []
+        started = time.monotonic()
+        try:
+            async for page in generate_deck_pages(
+                request, outline_data, cover_contents_chain, section_content_chain, chapter_group_chain
+            ):
+                pages.append(page)
+                yield page
+            await cache_set(response_cache, cache_key, pages, started)
+            
+        except Exception as e:
+            error_msg = f"生成过程中出错: {str(e)}"
+            logger.error(error_msg)
+            yield json.dumps({"error": error_msg}, ensure_ascii=False)
+    
+    ticket = admit_stream(cache_key)
+    return stream_response(http_request, "aippt", assembled(single_flight.stream(
+        cache_key, lambda: admission.stream(ticket, structured_page_stream, queue_hint)
+    ), assembler), raw_frames=True, ticket=ticket)
+
+
+class PPTRegenerateRequest(PPTContentRequest):
+    chapter: int = Field(None, ge=0, description="重新生成的章节序号，从 1 开始，0 表示封面/目录页")
+    page: int = Field(None, ge=0, description="重新生成的页码（从 0 开始），将重新生成该页所在的章节")
+
+
+async def locate_page(units: list, page: int) -> int:
+    """根据章节页面缓存中各部分的页数，找到第 page 页所在的部分（0 为封面/目录页）"""
+    offset = 0
+    for unit_idx, (_, key) in enumerate(units):
+        pages = await chapter_cache.get(key)
+        if pages is None:
+            raise HTTPException(status_code=409, detail="该页之前的内容尚未生成，请先生成完整 PPT")
+        if page < offset + len(pages):
+            return unit_idx
+        offset += len(pages)
+    raise HTTPException(status_code=400, detail="页码超出范围（结束页无需重新生成）")
+
+
+@router.post("/tools/aippt/regenerate")
+async def regenerate_ppt_pages(request: PPTRegenerateRequest, http_request: Request):
+    """重新生成单个章节（或指定页所在章节）的页面，并替换章节页面缓存中的旧页面
+    
+    只调用一次上游；之后用同一份大纲提交 /tools/aippt 时会输出新生成的页面。
+    响应头 X-Regenerated-Chapter 为实际重新生成的章节序号。依赖章节页面缓存，未开启时返回 409。
+    """
+    if not chapter_cache.enabled:
+        raise HTTPException(
+            status_code=409, detail="章节页面缓存未开启，无法重新生成章节（请设置 CHAPTER_CACHE_ENABLED=true）"
+        )
+    if (request.chapter is None) == (request.page is None):
+        raise HTTPException(status_code=400, detail="chapter 和 page 必须且只能指定一个")
+    outline_data = parse_content_outline(request)
+    units = [cover_unit(request)] + [chapter_unit(request, chapter) for chapter in outline_data['chapters']]
+    unit_idx = request.chapter if request.page is None else await locate_page(units, request.page)
+    if unit_idx >= len(units):
+        raise HTTPException(status_code=400, detail=f"章节序号超出范围（共 {len(units) - 1} 个章节）")
+    inputs, key = units[unit_idx]
+    
+    cover_contents_chain, section_content_chain, _ = build_content_chains(request.model)
+    chain = cover_contents_chain if unit_idx == 0 else section_content_chain
+    label = "封面/目录" if unit_idx == 0 else f"第{unit_idx}章"
+    logger.info(f"🔄 重新生成{label}")
+    
+    assembler = await build_assembler(request.template)
+    if assembler is not None and unit_idx > 0:
+        # 过渡页序号从该章节开始计算
+        assembler.transition_count = unit_idx - 1
+    deck_key = response_cache.make_key(
+        "aippt", request.model, request.language, request.content, CONTENT_PROMPT_VERSION
+    )
+    
+    async def regenerated_page_stream():
+        try:
+            async for page in store_pages(stream_chain_pages(chain, inputs), key):
+                yield page
+            # 整份 PPT 的生成结果缓存中仍是旧页面
+            await response_cache.delete(deck_key)
+        except Exception as e:
+            error_msg = f"重新生成{label}时出错: {str(e)}"
+            logger.error(error_msg)
+            yield json.dumps({"error": error_msg}, ensure_ascii=False)
+    
+    ticket = admit_stream()
+    return stream_response(
+        http_request, "aippt_regenerate",
+        assembled(admission.stream(ticket, regenerated_page_stream, queue_hint), assembler),
+        headers={"X-Regenerated-Chapter": str(unit_idx)},
+        raw_frames=True,
+        ticket=ticket
+    )
+
+
+@router.post("/tools/aippt/jobs")
+async def create_ppt_content_job(request: PPTContentRequest):
+    """创建后台PPT内容生成任务，返回任务 ID
+    
+    页面通过 GET /tools/aippt/jobs/{job_id}/stream 获取，断线后可携带
+    Last-Event-ID 请求头或 from_page 参数重连，只接收缺失的页面。
+    """
+    logger.info(f"🧾 收到任务创建请求: 模型={request.model}, 语言={request.language}")
+    outline_data = parse_content_outline(request)
+    
+    cache_key = response_cache.make_key(
+        "aippt", request.model, request.language, request.content, CONTENT_PROMPT_VERSION
+    )
+    cached_pages = await response_cache.get(cache_key)
+    if cached_pages is not None:
+        logger.info(f"🗄️ PPT内容命中缓存，共 {len(cached_pages)} 页")
+        job = await job_store.create(lambda: replay_chunks(cached_pages))
+        return job.to_dict()
+    
+    cover_contents_chain, section_content_chain, chapter_group_chain = build_content_chains(request.model)
+    
+    async def job_page_stream():
+        pages = []
+        started = time.monotonic()
+        async for page in generate_deck_pages(
+            request, outline_data, cover_contents_chain, section_content_chain, chapter_group_chain
+        ):
+            pages.append(page)
+            yield page
+        await cache_set(response_cache, cache_key, pages, started)
+    
+    ticket = admit_stream()
+    try:
+        job = await job_store.create(lambda: admission.stream(ticket, job_page_stream))
+    except BaseException:
+        ticket.release()
+        raise
+    return job.to_dict()
+
+
+@router.get("/tools/aippt/jobs/{job_id}")
+async def get_ppt_content_job(job_id: str):
+    """查询后台生成任务状态"""
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    return job.to_dict()
+
+
+@router.get("/tools/aippt/jobs/{job_id}/stream")
+async def stream_ppt_content_job(job_id: str, request: Request, from_page: int = None):
+    """以 SSE 格式流式返回任务页面，事件 id 为页码（从 0 开始）"""
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    
+    start = 0
+    last_event_id = request.headers.get("last-event-id")
+    if from_page is not None:
+        start = from_page
+    elif last_event_id is not None:
+        try:
+            start = int(last_event_id) + 1
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID 格式错误")
+    logger.info(f"🧾 客户端连接任务 {job_id}，从第 {start} 页开始")
+    
+    async def job_event_stream():
+        pages = job.subscribe(start)
+        try:
+            async for index, page in pages:
+                yield format_event(page, "page", index)
+        finally:
+            await pages.aclose()
+        if job.status == FAILED:
+            error_msg = json.dumps({"error": f"生成过程中出错: {job.error}"}, ensure_ascii=False)
+            yield format_event(error_msg, "error")
+    
+    body, output_headers = output_stage(request, "aippt_job", watch_disconnect(
+        request, job_event_stream(), settings.disconnect_poll_interval, settings.sse_heartbeat_interval
+    ))
+    return StreamingResponse(
+        track_active_stream("aippt_job", body),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **output_headers}
+    )
+
+
+@router.post("/tools/aippt_deck")
+async def generate_ppt_deck_stream(request: PPTOutlineRequest, http_request: Request):
+    """根据主题一次生成大纲和PPT内容（流水线式流式返回）
+    
+    大纲边生成边解析，每一章完整后立即开始生成该章的页面；
+    大纲 token 与生成好的页面通过同一个连接返回。
+    """
+    logger.info(f"🚄 收到流水线生成请求: 模型={request.model}, 语言={request.language}, 要求={request.content}")
     
     # 构建生成链
     try:
+        outline_chain = build_outline_chain(request.model)
         cover_contents_chain = build_cover_contents_chain(request.model)
         section_content_chain = build_section_content_chain(request.model)
     except HTTPException as e:
@@ -342,115 +1326,408 @@ async def generate_ppt_content_stream(request: PPTContentRequest):
         logger.error(f"构建生成链异常: {str(e)}")
         raise HTTPException(status_code=500, detail="服务器内部错误")
     
-    async def structured_page_stream():
+    def event(name: str, **fields) -> str:
+        return json.dumps({"event": name, **fields}, ensure_ascii=False) + "\n\n"
+    
+    async def pipelined_deck_stream():
+        # 队列元素为 (事件名, 事件文本)，None 表示一路输出结束，异常表示生成失败
+        events = asyncio.Queue()
+        chapter_slots = asyncio.Queue()
+        semaphore = asyncio.Semaphore(max(1, settings.max_concurrent_chapters))
+        tasks = []
+        chapter_count = 0
         page_count = 0
+        usage = PromptUsage()
         
-        try:
-            # 第一步：生成封面页和目录页
-            logger.info("🏠 开始生成封面页和目录页...")
-            buffer = ""
-            async for chunk in cover_contents_chain.astream({
+        def spawn(coro):
+            async def guarded():
+                try:
+                    await coro
+                except Exception as e:
+                    events.put_nowait(e)
+            tasks.append(asyncio.create_task(guarded()))
+        
+        async def generate_section(section_idx: int, chain, inputs: dict, queue: asyncio.Queue):
+            async with semaphore:
+                async for page in stream_parsed_pages(chain, inputs):
+                    queue.put_nowait(("page", event("page", section=section_idx, data=page.data)))
+            queue.put_nowait(None)
+        
+        def start_chapter(chapter: dict):
+            nonlocal chapter_count
+            chapter_count += 1
+            logger.info(f"📖 大纲第 {chapter_count} 章已完整，开始生成: {chapter['title']}")
+            queue = asyncio.Queue()
+            chapter_slots.put_nowait(queue)
+            inputs = {
                 "language": request.language,
-                "content": request.content
+                "section_title": chapter['title'],
+                "section_content": format_chapter(chapter)
+            }
+            usage.record(section_content_prompt, inputs)
+            spawn(generate_section(chapter_count, section_content_chain, inputs, queue))
+        
+        async def run_outline():
+            parser = OutlineParser()
+            outline_chunks = []
+            async for chunk in outline_chain.astream({
+                "content": request.content,
+                "language": request.language
             }):
-                buffer += chunk
-                # 检查缓冲区中是否包含完整的页面分隔符 "\n\n"
-                while "\n\n" in buffer:
-                    page_content, separator, rest_of_buffer = buffer.partition("\n\n")
-                    if page_content.strip():
-                        page_count += 1
-                        logger.debug(f"生成第 {page_count} 页内容（封面/目录）")
-                        yield page_content + separator
-                    buffer = rest_of_buffer
-            
-            # 处理剩余内容
-            if buffer.strip():
-                page_count += 1
-                logger.debug(f"生成第 {page_count} 页内容（封面/目录最后一页）")
-                yield buffer + "\n\n"
+                outline_chunks.append(chunk)
+                events.put_nowait(("outline", event("outline", data=chunk)))
+                for chapter in parser.feed(chunk):
+                    start_chapter(chapter)
+            for chapter in parser.close():
+                start_chapter(chapter)
+            chapter_slots.put_nowait(None)
+            events.put_nowait(("outline_end", event("outline_end", title=parser.result['title'], chapters=chapter_count)))
+            logger.info(f"📝 大纲生成完成: 标题={parser.result['title']}, 章节数={chapter_count}")
             
-            # 第二步：为每个章节生成过渡页和内容页
-            for chapter_idx, chapter in enumerate(outline_data['chapters']):
-                logger.info(f"📖 开始生成第 {chapter_idx + 1} 章: {chapter['title']}")
-                
-                # 准备章节内容字符串
-                section_content = f"## {chapter['title']}\n"
-                for section in chapter['sections']:
-                    section_content += f"### {section['title']}\n"
-                    for item in section['items']:
-                        section_content += f"- {item}\n"
-                
-                buffer = ""
-                async for chunk in section_content_chain.astream({
-                    "language": request.language,
-                    "section_title": chapter['title'],
-                    "section_content": section_content
-                }):
-                    buffer += chunk
-                    # 检查缓冲区中是否包含完整的页面分隔符 "\n\n"
-                    while "\n\n" in buffer:
-                        page_content, separator, rest_of_buffer = buffer.partition("\n\n")
-                        if page_content.strip():
-                            page_count += 1
-                            logger.debug(f"生成第 {page_count} 页内容（第{chapter_idx + 1}章）")
-                            yield page_content + separator
-                        buffer = rest_of_buffer
-                
-                # 处理剩余内容
-                if buffer.strip():
+            # 封面页和目录页依赖完整大纲（只需要标题结构）
+            outline = "".join(outline_chunks)
+            inputs = {
+                "language": request.language,
+                "content": outline_headings(outline, settings.cover_outline_max_tokens)
+            }
+            usage.record_trim(outline, inputs["content"])
+            usage.record(cover_contents_prompt, inputs)
+            spawn(generate_section(0, cover_contents_chain, inputs, events))
+        
+        async def order_chapters():
+            # 各章节页面按章节顺序输出
+            while (queue := await chapter_slots.get()) is not None:
+                while (item := await queue.get()) is not None:
+                    events.put_nowait(item)
+            events.put_nowait(None)
+        
+        spawn(run_outline())
+        spawn(order_chapters())
+        try:
+            # 等待封面/目录和全部章节两路输出结束
+            pending = 2
+            while pending:
+                item = await events.get()
+                if item is None:
+                    pending -= 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                kind, text = item
+                if kind == "page":
                     page_count += 1
-                    logger.debug(f"生成第 {page_count} 页内容（第{chapter_idx + 1}章最后一页）")
-                    yield buffer + "\n\n"
+                yield text
             
-            # 第三步：生成结束页
-            logger.info("🎬 开始生成结束页...")
             page_count += 1
-            logger.debug(f"生成第 {page_count} 页内容（结束页）")
-            yield '{"type": "end"}'
-            
-            logger.info(f"PPT内容生成完成，总共生成 {page_count} 页")
-            
+            yield event("page", section=chapter_count + 1, data={"type": "end"})
+            logger.info(f"PPT流水线生成完成，总共生成 {page_count} 页")
+            usage.log()
+        
         except Exception as e:
             error_msg = f"生成过程中出错: {str(e)}"
             logger.error(error_msg)
-            yield f'{{"error": "{error_msg}"}}'
+            yield event("error", message=error_msg)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    ticket = admit_stream()
+    return stream_response(http_request, "aippt_deck", admission.stream(
+        ticket, pipelined_deck_stream, lambda position: event("queue", position=position)
+    ), ticket=ticket)
 
-    return StreamingResponse(structured_page_stream(), media_type="text/event-stream")
 
+class BatchDeckItem(BaseModel):
+    model: str = Field('gpt-4o-mini', description="使用的模型名称，例如 gpt-4o 或 gpt-4o-mini")
+    language: str = Field(..., description="生成内容的语言，例如 中文、English")
+    content: str = Field(..., description="PPT主题或要求")
 
-# 添加健康检查端点
-@router.get("/health")
-async def health_check():
-    """健康检查端点"""
-    return {"status": "healthy", "message": "PPTist AI Backend is running"}
 
+class PPTBatchRequest(BaseModel):
+    decks: List[BatchDeckItem] = Field(..., description="要生成的PPT列表")
+    max_concurrency: int = Field(None, description="同时生成的PPT数量，不超过 BATCH_MAX_CONCURRENCY")
 
-# 添加JSON文件读取端点
-@router.get("/data/{filename}.json")
-async def get_json_file(filename: str):
-    """读取template目录下的JSON文件"""
+
+async def generate_outline_text(chain, deck: BatchDeckItem) -> str:
+    """生成完整大纲（与大纲接口共用缓存，批次内相同主题只生成一次）"""
+    cache_key = response_cache.make_key(
+        "aippt_outline", deck.model, deck.language, deck.content, OUTLINE_PROMPT_VERSION
+    )
+    cached_chunks = await response_cache.get(cache_key)
+    if cached_chunks is not None:
+        return "".join(cached_chunks)
+    
+    async def token_stream():
+        chunks = []
+        started = time.monotonic()
+        async for chunk in chain.astream({"content": deck.content, "language": deck.language}):
+            chunks.append(chunk)
+            yield chunk
+        await cache_set(response_cache, cache_key, chunks, started)
+    
+    return "".join([chunk async for chunk in single_flight.stream(f"batch:{cache_key}", token_stream)])
+
+
+async def generate_batch_pages(
+    request: PPTContentRequest, outline_data: dict, cover_contents_chain, section_content_chain, chapter_group_chain
+):
+    """生成PPT页面（与内容接口共用缓存，批次内相同大纲只生成一次）"""
+    cache_key = response_cache.make_key(
+        "aippt", request.model, request.language, request.content, CONTENT_PROMPT_VERSION
+    )
+    cached_pages = await response_cache.get(cache_key)
+    if cached_pages is not None:
+        for page in cached_pages:
+            yield page
+        return
+    
+    async def page_stream():
+        pages = []
+        started = time.monotonic()
+        async for page in generate_deck_pages(
+            request, outline_data, cover_contents_chain, section_content_chain, chapter_group_chain
+        ):
+            pages.append(page)
+            yield page
+        await cache_set(response_cache, cache_key, pages, started)
+    
+    async for page in single_flight.stream(f"batch:{cache_key}", page_stream):
+        yield page
+
+
+@router.post("/tools/aippt_batch")
+async def generate_ppt_batch(request: PPTBatchRequest, http_request: Request):
+    """批量生成PPT（大纲 + 内容），以 NDJSON 流式返回每个PPT的进度和页面
+    
+    所有PPT共用上游连接池、生成结果缓存和限流配额，同时生成的数量受
+    BATCH_MAX_CONCURRENCY 限制，吞吐量由上游速率限制决定。
+    """
+    if not request.decks:
+        raise HTTPException(status_code=400, detail="decks 不能为空")
+    if len(request.decks) > settings.batch_max_decks:
+        raise HTTPException(status_code=400, detail=f"单次最多生成 {settings.batch_max_decks} 个PPT")
+    concurrency = max(1, min(request.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency))
+    logger.info(f"📚 收到批量生成请求: {len(request.decks)} 个PPT, 并发数={concurrency}")
+    
+    # 提前为每个模型构建生成链，配置错误时直接返回
+    chains = {}
     try:
-        # 构建文件路径
-        file_path = os.path.join("template", f"{filename}.json")
-        
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            logger.warning(f"📁 文件不存在: {file_path}")
-            raise HTTPException(status_code=404, detail=f"文件 {filename}.json 不存在")
+        for deck in request.decks:
+            if deck.model not in chains:
+                chains[deck.model] = (build_outline_chain(deck.model), *build_content_chains(deck.model))
+    except HTTPException as e:
+        logger.error(f"构建生成链失败: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"构建生成链异常: {str(e)}")
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+    
+    def line(**fields) -> str:
+        return json.dumps(fields, ensure_ascii=False) + "\n"
+    
+    async def generate_one(index: int, deck: BatchDeckItem, events: asyncio.Queue) -> bool:
+        outline_chain, cover_contents_chain, section_content_chain, chapter_group_chain = chains[deck.model]
+        started = time.perf_counter()
+        events.put_nowait(line(deck=index, event="start", content=deck.content))
+        try:
+            outline = await generate_outline_text(outline_chain, deck)
+            outline_data = parse_outline(outline)
+            events.put_nowait(line(
+                deck=index, event="outline", title=outline_data["title"],
+                chapters=len(outline_data["chapters"]), content=outline
+            ))
+            content_request = PPTContentRequest(model=deck.model, language=deck.language, content=outline)
+            page_count = 0
+            async for page in generate_batch_pages(
+                content_request, outline_data, cover_contents_chain, section_content_chain, chapter_group_chain
+            ):
+                page_count += 1
+                events.put_nowait(line(deck=index, event="page", data=json.loads(page)))
+            elapsed = time.perf_counter() - started
+            events.put_nowait(line(deck=index, event="done", pages=page_count, elapsed=round(elapsed, 3)))
+            logger.info(f"📚 批量生成第 {index + 1} 个PPT完成，共 {page_count} 页，用时 {elapsed:.1f}s")
+            return True
+        except Exception as e:
+            error_msg = f"生成过程中出错: {str(e)}"
+            logger.error(f"📚 批量生成第 {index + 1} 个PPT失败: {error_msg}")
+            events.put_nowait(line(deck=index, event="error", message=error_msg))
+            return False
+    
+    async def batch_stream():
+        events = asyncio.Queue()
+        semaphore = asyncio.Semaphore(concurrency)
+        results = []
+        started = time.perf_counter()
         
-        # 读取JSON文件
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        async def run(index: int, deck: BatchDeckItem):
+            async with semaphore:
+                results.append(await generate_one(index, deck, events))
         
-        logger.info(f"📄 成功读取文件: {filename}.json")
-        return data
+        async def run_all():
+            await asyncio.gather(*(run(i, deck) for i, deck in enumerate(request.decks)))
+            events.put_nowait(None)
         
+        driver = asyncio.create_task(run_all())
+        try:
+            while (item := await events.get()) is not None:
+                yield item
+            completed = sum(results)
+            yield line(
+                event="batch_end", decks=len(request.decks), completed=completed,
+                failed=len(results) - completed, elapsed=round(time.perf_counter() - started, 3)
+            )
+            logger.info(f"📚 批量生成完成: 成功 {completed}/{len(request.decks)}")
+        finally:
+            if not driver.done():
+                driver.cancel()
+                await asyncio.gather(driver, return_exceptions=True)
+    
+    ticket = admit_stream()
+    body, output_headers = output_stage(http_request, "aippt_batch", watch_disconnect(
+        http_request,
+        admission.stream(ticket, batch_stream, lambda position: line(event="queue", position=position)),
+        settings.disconnect_poll_interval
+    ))
+    return ClosingStreamingResponse(
+        track_active_stream("aippt_batch", body),
+        media_type="application/x-ndjson",
+        headers=output_headers,
+        on_close=ticket.release_unclaimed
+    )
+
+
+# 添加健康检查端点
+@router.get("/health")
+async def health_check():
+    """存活检查：进程已启动即返回 healthy，ready 表示是否已完成启动预热"""
+    return {"status": "healthy", "message": "PPTist AI Backend is running", **startup.report()}
+
+
+@router.get("/health/ready")
+async def readiness_check():
+    """就绪检查：启动预热完成前和关闭排空期间返回 503"""
+    if drain.draining:
+        return JSONResponse(status_code=503, content={"status": "draining", **startup.report()})
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", **startup.report()})
+    return {"status": "ready", **startup.report()}
+
+
+@router.get("/health/load")
+async def load_check():
+    """本工作进程和同一实例所有工作进程的负载，供前端代理分配长连接"""
+    workers = await asyncio.to_thread(worker_load.workers)
+    return {"worker": workers[0], "instance": summarize_load(workers)}
+
+
+# 添加 Prometheus 指标端点
+if settings.metrics_enabled:
+    @router.get("/metrics")
+    async def metrics():
+        """Prometheus 格式的运行指标"""
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+async def load_template(filename: str):
+    """读取模板缓存条目，文件不存在或格式错误时抛出 HTTPException"""
+    try:
+        entry = await template_store.get(filename)
     except json.JSONDecodeError as e:
         logger.error(f"🚫 JSON格式错误: {filename}.json - {str(e)}")
         raise HTTPException(status_code=400, detail=f"文件 {filename}.json 格式错误")
     except Exception as e:
         logger.error(f"🚫 读取文件失败: {filename}.json - {str(e)}")
         raise HTTPException(status_code=500, detail="服务器内部错误")
+    
+    # 检查文件是否存在
+    if entry is None:
+        logger.warning(f"📁 文件不存在: {template_store.path_for(filename)}")
+        raise HTTPException(status_code=404, detail=f"文件 {filename}.json 不存在")
+    return entry
+
+
+def template_fragment_response(request: Request, fragment: TemplateFragment, started: float) -> Response:
+    """返回模板片段（主题、清单或部分幻灯片），支持 ETag 和 gzip 压缩"""
+    headers = {
+        "ETag": fragment.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(headers["ETag"], request.headers.get("if-none-match")):
+        TEMPLATE_RESPONSE.labels("304", "none").observe(time.perf_counter() - started)
+        return Response(status_code=304, headers=headers)
+    
+    accepted = accepted_encodings(request.headers.get("accept-encoding"))
+    encoding = None
+    body = fragment.body
+    if fragment.gzip is not None and ("gzip" in accepted or "*" in accepted):
+        encoding = "gzip"
+        headers["Content-Encoding"] = encoding
+        body = fragment.gzip
+    TEMPLATE_RESPONSE.labels("200", encoding or "identity").observe(time.perf_counter() - started)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# 添加JSON文件读取端点
+@router.get("/data/{filename}.json")
+async def get_json_file(filename: str, request: Request):
+    """读取template目录下的JSON文件（内存缓存，支持压缩和 ETag）"""
+    started = time.perf_counter()
+    entry = await load_template(filename)
+    
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if entry.matches(request.headers.get("if-none-match")):
+        logger.debug(f"📄 文件未修改: {filename}.json")
+        TEMPLATE_RESPONSE.labels("304", "none").observe(time.perf_counter() - started)
+        return Response(status_code=304, headers=headers)
+    
+    encoding = entry.select_encoding(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = entry.encoded[encoding]
+    else:
+        body = entry.body
+    
+    logger.debug(f"📄 成功读取文件: {filename}.json ({encoding or 'identity'})")
+    TEMPLATE_RESPONSE.labels("200", encoding or "identity").observe(time.perf_counter() - started)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/data/{filename}/theme")
+async def get_template_theme(filename: str, request: Request):
+    """只返回模板的元信息（标题、尺寸和主题）"""
+    started = time.perf_counter()
+    entry = await load_template(filename)
+    return template_fragment_response(request, entry.meta_fragment, started)
+
+
+@router.get("/data/{filename}/manifest")
+async def get_template_manifest(filename: str, request: Request):
+    """返回模板元信息和幻灯片清单（类型、条目数、元素数、字节数和图片字节数）"""
+    started = time.perf_counter()
+    entry = await load_template(filename)
+    return template_fragment_response(request, entry.manifest_fragment, started)
+
+
+@router.get("/data/{filename}/slides")
+async def get_template_slides(
+    filename: str,
+    request: Request,
+    slide_type: list[str] = Query(None, alias="type", description="幻灯片类型，可重复，例如 cover、contents、content"),
+    items: list[int] = Query(None, description="条目数，可重复"),
+    slide_id: list[str] = Query(None, alias="id", description="幻灯片 ID，可重复"),
+):
+    """按类型、条目数或 ID 筛选幻灯片，返回与完整模板结构相同的 JSON"""
+    started = time.perf_counter()
+    entry = await load_template(filename)
+    selected = entry.select_slides(slide_type, items, slide_id)
+    logger.debug(f"📄 模板 {filename}.json 筛选出 {len(selected)}/{len(entry.slides)} 张幻灯片")
+    return template_fragment_response(request, TemplateFragment.build(entry.slides_body(selected)), started)
 
 
 # 注册路由
@@ -466,14 +1743,26 @@ async def root():
         "endpoints": {
             "outline": "/tools/aippt_outline",
             "content": "/tools/aippt",
+            "deck": "/tools/aippt_deck",
+            "jobs": "/tools/aippt/jobs",
+            "regenerate": "/tools/aippt/regenerate",
+            "batch": "/tools/aippt_batch",
             "health": "/health",
+            "ready": "/health/ready",
+            "load": "/health/load",
             "data": "/data/{filename}.json",
+            "template_theme": "/data/{filename}/theme",
+            "template_manifest": "/data/{filename}/manifest",
+            "template_slides": "/data/{filename}/slides",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
 
 
 if __name__ == "__main__":
+    import tempfile
+    import importlib.util
     import uvicorn
     
     if not settings.validate():
@@ -482,16 +1771,37 @@ if __name__ == "__main__":
         logger.error("可以复制 .env.example 为 .env 并修改其中的 API Key")
         exit(1)
     
+    # 调试模式（自动重载）只能使用单进程
+    workers = 1 if settings.debug else max(1, settings.workers)
+    if workers > 1 and not settings.worker_state_dir:
+        # 子进程重新导入 main 时读取该目录，汇总各工作进程负载
+        os.environ["WORKER_STATE_DIR"] = os.path.join(tempfile.gettempdir(), f"pptist-workers-{settings.port}")
+    loop = settings.server_loop
+    if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+        logger.warning("⚠️ 未安装 uvloop，使用 asyncio 事件循环")
+        loop = "asyncio"
+    http = settings.server_http
+    if http == "httptools" and importlib.util.find_spec("httptools") is None:
+        logger.warning("⚠️ 未安装 httptools，使用 h11 解析 HTTP")
+        http = "h11"
+    
     logger.info(f"🚀 启动 PPTist AI Backend...")
     logger.info(f"📡 服务器地址: http://{settings.host}:{settings.port}")
     logger.info(f"📚 API 文档: http://{settings.host}:{settings.port}/docs")
+    logger.info(f"⚙️ 工作进程: {workers}, 事件循环: {loop}, HTTP: {http}, 排空超时: {settings.graceful_shutdown_timeout:g} 秒")
     
     try:
         uvicorn.run(
             "main:app",  # 使用字符串导入路径以支持 reload 功能
             host=settings.host,
             port=settings.port,
-            reload=settings.debug
+            reload=settings.debug,
+            workers=workers,
+            loop=loop,
+            http=http,
+            backlog=settings.server_backlog,
+            timeout_keep_alive=settings.keepalive_timeout,
+            timeout_graceful_shutdown=settings.graceful_shutdown_timeout
         )
     except Exception as e:
         logger.error(f"❌ 启动失败: {str(e)}")
@@ -0,0 +1,136 @@
+"""
+指标与追踪模块
+
+定义 Prometheus 指标（上游首 token 延迟、每次链调用/每章耗时、页面输出延迟、
+各模型输入输出 token、活跃流数量、缓存命中情况），并提供可选的
+OpenTelemetry span（安装 opentelemetry-api 且 OTEL_ENABLED=true 时生效）。
+"""
+import time
+import logging
+from typing import AsyncIterator
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from tokens import estimate_tokens
+
+try:
+    from opentelemetry import trace
+except ImportError:  # opentelemetry 为可选依赖
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+UPSTREAM_TTFT = Histogram(
+    "pptist_upstream_ttft_seconds", "上游首 token 延迟", ["chain", "model"], buckets=LATENCY_BUCKETS
+)
+CHAIN_DURATION = Histogram(
+    "pptist_chain_duration_seconds", "单次链调用耗时（section_content 即每章耗时）",
+    ["chain", "model"], buckets=LATENCY_BUCKETS
+)
+PAGE_EMIT_LATENCY = Histogram(
+    "pptist_page_emit_latency_seconds", "页面从开始输出到解析完成的耗时", ["page_type"], buckets=LATENCY_BUCKETS
+)
+INVALID_PAGES = Counter("pptist_invalid_pages_total", "模型输出中格式不合法的页面数")
+PAGE_REPAIRS = Counter("pptist_page_repairs_total", "单独重新生成不合法页面的结果（repaired/failed）", ["result"])
+TOKENS = Counter("pptist_tokens_total", "各模型的输入/输出 token 数（估算）", ["model", "direction"])
+PROMPT_TOKENS = Counter("pptist_prompt_tokens_total", "提示词 token 数（估算，prefix/request/trimmed）", ["kind"])
+CHAIN_ERRORS = Counter("pptist_chain_errors_total", "链调用失败次数", ["chain", "model"])
+ACTIVE_STREAMS = Gauge("pptist_active_streams", "正在进行的流式响应数", ["endpoint"])
+STREAM_CHUNKS = Counter(
+    "pptist_stream_chunks_total", "流式响应的分块数（in 为合并前，out 为实际写出）", ["endpoint", "stage"]
+)
+STREAM_BYTES = Counter(
+    "pptist_stream_bytes_total", "流式响应的字节数（raw 为压缩前，wire 为实际写出）", ["endpoint", "stage"]
+)
+CACHE_REQUESTS = Counter("pptist_cache_requests_total", "缓存查询次数", ["cache", "result"])
+DEGRADED_CALLS = Counter("pptist_degraded_calls_total", "上游不可用时改用本地模板生成的调用次数", ["chain"])
+ADMISSION_QUEUE_DEPTH = Gauge("pptist_admission_queue_depth", "等待准入的生成流数量")
+ADMISSION_REJECTED = Counter("pptist_admission_rejected_total", "因等待队列已满被拒绝的请求数")
+TEMPLATE_RESPONSE = Histogram(
+    "pptist_template_response_seconds", "模板文件接口处理耗时", ["status", "encoding"], buckets=FAST_BUCKETS
+)
+
+_tracer = None
+
+
+def setup_tracing(enabled: bool):
+    """按配置启用 OpenTelemetry 追踪"""
+    global _tracer
+    if enabled and trace is None:
+        logger.warning("⚠️ 未安装 opentelemetry-api，追踪未启用")
+    _tracer = trace.get_tracer("pptist-aibackend") if enabled and trace is not None else None
+
+
+class InstrumentedChain:
+    """为生成链的 astream 调用记录指标和追踪
+
+    首 token 时间和调用耗时从通过本地准入（并发名额、速率配额）时开始计算，不包含本地排队时间。
+    """
+
+    def __init__(self, name: str, model: str, prompt, chain):
+        self.name = name
+        self.model = model
+        self.prompt = prompt
+        self.chain = chain
+
+    async def astream(self, inputs: dict) -> AsyncIterator[str]:
+        span = None
+        if _tracer is not None:
+            span = _tracer.start_span(f"chain.{self.name}", attributes={"llm.model": self.model})
+        TOKENS.labels(self.model, "in").inc(estimate_tokens(self.prompt.format(**inputs)))
+        started = time.perf_counter()
+        first = True
+        output_tokens = 0
+
+        def admitted():
+            nonlocal started
+            started = time.perf_counter()
+            if span is not None:
+                span.add_event("admitted")
+
+        try:
+            async for chunk in self.chain.astream(inputs, on_admitted=admitted):
+                if first:
+                    first = False
+                    ttft = time.perf_counter() - started
+                    UPSTREAM_TTFT.labels(self.name, self.model).observe(ttft)
+                    if span is not None:
+                        span.add_event("first_token", {"ttft": ttft})
+                output_tokens += estimate_tokens(chunk)
+                yield chunk
+            CHAIN_DURATION.labels(self.name, self.model).observe(time.perf_counter() - started)
+        except Exception as e:
+            CHAIN_ERRORS.labels(self.name, self.model).inc()
+            if span is not None:
+                span.record_exception(e)
+            raise
+        finally:
+            TOKENS.labels(self.model, "out").inc(output_tokens)
+            if span is not None:
+                span.set_attribute("llm.output_tokens", output_tokens)
+                span.end()
+
+
+# 本进程正在进行的流式响应数（用于负载上报）
+_open_streams = 0
+
+
+def open_stream_count() -> int:
+    return _open_streams
+
+
+async def track_active_stream(endpoint: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """统计正在进行的流式响应"""
+    global _open_streams
+    ACTIVE_STREAMS.labels(endpoint).inc()
+    _open_streams += 1
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        ACTIVE_STREAMS.labels(endpoint).dec()
+        _open_streams -= 1
+        await stream.aclose()
@@ -0,0 +1,84 @@
+"""
+大纲解析模块
+
+OutlineParser 按行增量解析 Markdown 大纲，某一章在下一章的 "## " 标题到达
+（或输入结束）时即视为完整；parse_outline 是对完整文本的一次性解析。
+"""
+from typing import List, Optional
+
+
+class OutlineParser:
+    """增量大纲解析器"""
+
+    def __init__(self):
+        self.result = {
+            'title': '',
+            'chapters': []
+        }
+        self._pending = ""
+        self._current_chapter: Optional[dict] = None
+        self._current_section: Optional[dict] = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        """输入一段文本，返回因此而完整的章节"""
+        completed = []
+        lines = (self._pending + chunk).split('\n')
+        self._pending = lines.pop()
+        for line in lines:
+            chapter = self._feed_line(line)
+            if chapter is not None:
+                completed.append(chapter)
+        return completed
+
+    def close(self) -> List[dict]:
+        """输入结束，返回剩余的完整章节"""
+        completed = []
+        if self._pending:
+            chapter = self._feed_line(self._pending)
+            self._pending = ""
+            if chapter is not None:
+                completed.append(chapter)
+        # 添加最后一个章节
+        if self._current_chapter:
+            self.result['chapters'].append(self._current_chapter)
+            completed.append(self._current_chapter)
+            self._current_chapter = None
+            self._current_section = None
+        return completed
+
+    def _feed_line(self, line: str) -> Optional[dict]:
+        line = line.strip()
+        if not line:
+            return None
+
+        completed = None
+        if line.startswith('# '):  # PPT标题
+            self.result['title'] = line[2:].strip()
+        elif line.startswith('## '):  # 章节标题
+            if self._current_chapter:
+                self.result['chapters'].append(self._current_chapter)
+                completed = self._current_chapter
+            self._current_chapter = {
+                'title': line[3:].strip(),
+                'sections': []
+            }
+            self._current_section = None
+        elif line.startswith('### '):  # 节标题
+            if self._current_chapter:
+                self._current_section = {
+                    'title': line[4:].strip(),
+                    'items': []
+                }
+                self._current_chapter['sections'].append(self._current_section)
+        elif line.startswith('- '):  # 内容项
+            if self._current_section:
+                self._current_section['items'].append(line[2:].strip())
+        return completed
+
+
+def parse_outline(content: str) -> dict:
+    """解析大纲内容，提取标题和章节信息"""
+    parser = OutlineParser()
+    parser.feed(content.strip())
+    parser.close()
+    return parser.result
@@ -0,0 +1,102 @@
+"""
+PPT 页面数据模型
+
+与 PPTist AIPPT 所需的页面 JSON 结构保持一致，用于校验生成的页面，
+以及在结构化输出模式下生成传给模型的 JSON Schema。
+"""
+from functools import lru_cache
+from typing import Annotated, List, Literal, Tuple, Union
+
+from pydantic import BaseModel, Field, TypeAdapter, create_model
+
+
+class CoverData(BaseModel):
+    title: str
+    text: str
+
+
+class CoverPage(BaseModel):
+    type: Literal["cover"]
+    data: CoverData
+
+
+class ContentsData(BaseModel):
+    items: List[str]
+
+
+class ContentsPage(BaseModel):
+    type: Literal["contents"]
+    data: ContentsData
+
+
+class TransitionData(BaseModel):
+    title: str
+    text: str
+
+
+class TransitionPage(BaseModel):
+    type: Literal["transition"]
+    data: TransitionData
+
+
+class ContentItem(BaseModel):
+    title: str
+    text: str
+
+
+class ContentData(BaseModel):
+    title: str
+    items: List[ContentItem]
+
+
+class ContentPage(BaseModel):
+    type: Literal["content"]
+    data: ContentData
+
+
+class EndPage(BaseModel):
+    type: Literal["end"]
+
+
+Page = Annotated[
+    Union[CoverPage, ContentsPage, TransitionPage, ContentPage, EndPage],
+    Field(discriminator="type"),
+]
+
+page_adapter = TypeAdapter(Page)
+
+PAGE_MODELS = {
+    "cover": CoverPage,
+    "contents": ContentsPage,
+    "transition": TransitionPage,
+    "content": ContentPage,
+}
+
+
+def _strict(schema):
+    """按 OpenAI strict 模式的要求调整 schema：对象禁止额外字段、全部字段必填、const 改为 enum"""
+    if isinstance(schema, dict):
+        if "const" in schema:
+            schema["enum"] = [schema.pop("const")]
+        if schema.get("type") == "object" and "properties" in schema:
+            schema["additionalProperties"] = False
+            schema["required"] = list(schema["properties"])
+        for value in schema.values():
+            _strict(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            _strict(value)
+    return schema
+
+
+@lru_cache(maxsize=None)
+def page_list_schema(page_types: Tuple[str, ...], tagged: bool = False) -> dict:
+    """结构化输出的 JSON Schema：{"pages": [页面, ...]}，tagged 时每个页面带 chapter 序号"""
+    models = [PAGE_MODELS[page_type] for page_type in page_types]
+    if tagged:
+        models = [
+            create_model(f"Tagged{model.__name__}", __base__=model, chapter=(int, ...))
+            for model in models
+        ]
+    wrapper = create_model("PageList", pages=(List[Union[tuple(models)]], ...))
+    return {"name": "pages", "strict": True, "schema": _strict(wrapper.model_json_schema())}
@@ -0,0 +1,150 @@
+"""
+增量页面解析模块
+
+随 token 到达增量跟踪花括号深度和字符串转义状态（总体 O(n)），
+每当一个顶层 JSON 对象闭合时立即解析、按页面结构校验并输出，
+不依赖模型是否正确输出 "\\n\\n" 分隔符。
+
+结构化输出模式下页面位于 {"pages": [...]} 中，level=1 时提取第二层的对象。
+"""
+import re
+import json
+import time
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from pydantic import ValidationError
+
+from page_models import page_adapter
+
+logger = logging.getLogger(__name__)
+
+# 影响解析状态的字符
+_SPECIAL = re.compile(r'[{}"\\]')
+
+
+@dataclass
+class ParsedPage:
+    """解析完成的页面"""
+    data: Optional[dict]
+    text: str
+    latency: float
+    # 页面不合法时的错误信息（只在 keep_invalid 时返回这类页面，data 为 None）
+    error: Optional[str] = None
+
+
+class PageExtractor:
+    """从流式文本中增量提取页面 JSON 对象
+
+    level 为页面对象所在的嵌套层数；keep_invalid 时不合法的页面也按顺序返回（带 error），
+    由调用方决定是否重新生成该页。
+    """
+
+    def __init__(self, level: int = 0, keep_invalid: bool = False):
+        self.level = level
+        self.keep_invalid = keep_invalid
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._parts: List[str] = []
+        self._started_at = 0.0
+        self.page_count = 0
+        self.invalid_count = 0
+        self.parse_latencies: List[float] = []
+
+    def feed(self, chunk: str) -> List[ParsedPage]:
+        """输入一段文本，返回其中闭合的所有页面"""
+        pages = []
+        pos = 0
+        start = 0 if self._depth > self.level else None
+        if self._escape and chunk:
+            # 上一段以反斜杠结尾，本段第一个字符被转义
+            self._escape = False
+            pos = 1
+        while True:
+            match = _SPECIAL.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            ch = chunk[i]
+            pos = i + 1
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    if self.level == 0:
+                        self._started_at = time.perf_counter()
+                        start = i
+                continue
+            if self._in_string:
+                if ch == "\\":
+                    if i + 1 < len(chunk):
+                        pos = i + 2
+                    else:
+                        self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+                if self._depth == self.level + 1:
+                    self._started_at = time.perf_counter()
+                    start = i
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == self.level:
+                    self._parts.append(chunk[start:pos])
+                    start = None
+                    page = self._finish()
+                    if page is not None:
+                        pages.append(page)
+        if self._depth > self.level and start is not None:
+            self._parts.append(chunk[start:])
+        return pages
+
+    def _finish(self) -> Optional[ParsedPage]:
+        text = "".join(self._parts)
+        self._parts = []
+        try:
+            data = json.loads(text)
+            page_adapter.validate_python(data)
+        except json.JSONDecodeError as e:
+            return self._invalid(text, str(e))
+        except ValidationError as e:
+            return self._invalid(text, "; ".join(
+                f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()
+            ))
+        latency = time.perf_counter() - self._started_at
+        self.page_count += 1
+        self.parse_latencies.append(latency)
+        return ParsedPage(
+            data=data,
+            text=json.dumps(data, ensure_ascii=False),
+            latency=latency,
+        )
+
+    def _invalid(self, text: str, error: str) -> Optional[ParsedPage]:
+        self.invalid_count += 1
+        if not self.keep_invalid:
+            logger.warning(f"⚠️ 丢弃格式不合法的页面: {text[:200]} - {error}")
+            return None
+        logger.warning(f"⚠️ 页面格式不合法: {text[:200]} - {error}")
+        return ParsedPage(
+            data=None,
+            text=text,
+            latency=time.perf_counter() - self._started_at,
+            error=error,
+        )
+
+    def close(self) -> Optional[ParsedPage]:
+        """输入结束；存在未闭合的页面时按不合法页面处理（keep_invalid 时返回该页面）"""
+        page = None
+        if self._depth > self.level:
+            page = self._invalid("".join(self._parts), "输出结束时页面未闭合")
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._parts = []
+        return page
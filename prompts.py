@@ -0,0 +1,113 @@
+"""
+提示词组装模块
+
+- 静态指令和示例放在 system 消息中，作为每次调用完全相同的前缀，
+  支持前缀缓存的服务商（如 OpenAI 自动缓存）可以命中；
+  每次请求变化的内容放在最后的 human 消息中；
+- 封面/目录页只需要标题和章节结构，按 token 预算裁剪掉大纲中的要点；
+- 按 PPT 统计输入 token、可缓存前缀 token 和裁剪节省的 token。
+
+LangChain 提示词模板在首次使用（或启动预热）时才构建，导入本模块不会加载 LangChain。
+"""
+import logging
+from typing import List, Tuple
+
+from metrics import PROMPT_TOKENS
+from tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class PromptSpec:
+    """静态指令（system 消息）+ 请求模板（human 消息），两者均为 f-string 格式"""
+
+    def __init__(self, instructions: str, request: str):
+        self.instructions = instructions
+        self.request = request
+        self._template = None
+
+    @property
+    def template(self):
+        """对应的 LangChain ChatPromptTemplate（首次访问时构建）"""
+        if self._template is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            self._template = ChatPromptTemplate.from_messages(
+                [("system", self.instructions), ("human", self.request)]
+            )
+        return self._template
+
+    def compile(self):
+        """提前构建 LangChain 提示词模板（启动预热时调用）"""
+        return self.template
+
+    def format_messages(self, **inputs) -> Tuple[str, str]:
+        """返回 (system, human) 消息文本，与 ChatPromptTemplate 的格式化结果一致"""
+        return self.instructions.format(), self.request.format(**inputs)
+
+    def format(self, **inputs) -> str:
+        return "\n".join(self.format_messages(**inputs))
+
+    def __or__(self, other):
+        return self.template | other
+
+
+def build_prompt(instructions: str, request: str) -> PromptSpec:
+    """静态指令在前（可缓存前缀），请求变量在后"""
+    return PromptSpec(instructions, request)
+
+
+def outline_headings(content: str, max_tokens: int) -> str:
+    """只保留大纲中的标题行；### 小节标题在 token 预算内才保留"""
+    lines = [line.strip() for line in content.splitlines() if line.strip().startswith("#")]
+    required = [line for line in lines if not line.startswith("###")]
+    if estimate_tokens("\n".join(lines)) <= max_tokens:
+        return "\n".join(lines)
+    return "\n".join(required)
+
+
+class PromptUsage:
+    """一份 PPT 的提示词 token 统计（估算值）"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prefix_tokens = 0
+        self.request_tokens = 0
+        self.cacheable_tokens = 0
+        self.trimmed_tokens = 0
+        self._seen_prefixes: List[str] = []
+
+    def record(self, prompt: PromptSpec, inputs: dict):
+        """记录一次调用；同一前缀第二次及以后出现时计为可缓存 token"""
+        system, human = prompt.format_messages(**inputs)
+        prefix_tokens = estimate_tokens(system)
+        request_tokens = estimate_tokens(human)
+        self.calls += 1
+        self.prefix_tokens += prefix_tokens
+        self.request_tokens += request_tokens
+        if system in self._seen_prefixes:
+            self.cacheable_tokens += prefix_tokens
+        else:
+            self._seen_prefixes.append(system)
+        PROMPT_TOKENS.labels("prefix").inc(prefix_tokens)
+        PROMPT_TOKENS.labels("request").inc(request_tokens)
+
+    def record_trim(self, original: str, trimmed: str):
+        saved = max(0, estimate_tokens(original) - estimate_tokens(trimmed))
+        self.trimmed_tokens += saved
+        PROMPT_TOKENS.labels("trimmed").inc(saved)
+
+    def report(self) -> dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.prefix_tokens + self.request_tokens,
+            "prefix_tokens": self.prefix_tokens,
+            "cacheable_tokens": self.cacheable_tokens,
+            "trimmed_tokens": self.trimmed_tokens,
+        }
+
+    def log(self):
+        report = self.report()
+        logger.info(
+            f"🧮 提示词 token 估算: {report['calls']} 次调用, 输入 {report['input_tokens']}, "
+            f"其中可缓存前缀 {report['cacheable_tokens']}, 大纲裁剪节省 {report['trimmed_tokens']}"
+        )
@@ -0,0 +1,213 @@
+"""
+上游调用容错模块
+
+- 多端点故障转移：按健康评分（首 token 延迟和错误率的滑动平均）对配置的
+  OpenAI 兼容端点排序，首 token 之前失败时自动切换到下一个端点；
+- 对冲请求：首 token 等待时间超过该端点历史 TTFT 的指定百分位时，
+  向另一个端点发送重复请求，先返回首 token 的一方胜出，另一方被取消；
+  计时从获取到本地准入名额和配额之后开始，本地排队不计入首 token 延迟，
+  也不会在上游配额已满时触发对冲；
+- 重试退避：retry_delay 提供带抖动的指数退避时间，供按章节重试使用。
+"""
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempt: int, base: float, maximum: float) -> float:
+    """第 attempt 次重试前的等待时间（指数退避 + 全抖动）"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+class EndpointStats:
+    """单个端点的健康统计"""
+
+    def __init__(self):
+        self.ttft_samples = deque(maxlen=200)
+        self.ewma_ttft: Optional[float] = None
+        self.ewma_error = 0.0
+
+    def record_ttft(self, ttft: float):
+        self.ttft_samples.append(ttft)
+        self.ewma_ttft = ttft if self.ewma_ttft is None else 0.8 * self.ewma_ttft + 0.2 * ttft
+        self.ewma_error *= 0.8
+
+    def record_failure(self):
+        self.ewma_error = 0.8 * self.ewma_error + 0.2
+
+    def score(self) -> float:
+        """分数越低越优先；未知端点按 1 秒计"""
+        ttft = self.ewma_ttft if self.ewma_ttft is not None else 1.0
+        return ttft * (1 + 10 * self.ewma_error)
+
+    def ttft_percentile(self, pct: float) -> Optional[float]:
+        if len(self.ttft_samples) < 10:
+            return None
+        ordered = sorted(self.ttft_samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class EndpointHealth:
+    """所有端点的健康统计，按 (base_url, model) 区分"""
+
+    def __init__(self):
+        self._stats: Dict[tuple, EndpointStats] = {}
+
+    def get(self, endpoint: dict) -> EndpointStats:
+        key = (endpoint["openai_api_base"], endpoint["model"])
+        if key not in self._stats:
+            self._stats[key] = EndpointStats()
+        return self._stats[key]
+
+    def rank(self, endpoints: List[dict]) -> List[int]:
+        """按健康评分返回端点下标（稳定排序，评分相同时保持配置顺序）"""
+        return sorted(range(len(endpoints)), key=lambda i: self.get(endpoints[i]).score())
+
+
+class _Attempt:
+    """对单个端点的一次调用；started_at 为通过本地准入、开始调用上游的时间"""
+
+    def __init__(self, index: int, endpoint: dict, chain, inputs: dict, on_admitted: Callable[[], None]):
+        self.index = index
+        self.endpoint = endpoint
+        self.on_admitted = on_admitted
+        self.started_at: Optional[float] = None
+        self.admitted = asyncio.Event()
+        self.stream = chain.astream(inputs, on_admitted=self._on_admitted)
+        self.task = asyncio.ensure_future(self.stream.__anext__())
+
+    def _on_admitted(self):
+        self.started_at = time.perf_counter()
+        self.admitted.set()
+        self.on_admitted()
+
+    async def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except BaseException:
+                pass
+        await self.stream.aclose()
+
+
+class ResilientChain:
+    """带故障转移和对冲请求的生成链
+
+    chains 为各端点经过准入控制的生成链（AdmittedChain），astream 接受 on_admitted 回调。
+    """
+
+    def __init__(self, endpoints: List[dict], chains: list, health: EndpointHealth, settings):
+        self.endpoints = endpoints
+        self.chains = chains
+        self.health = health
+        self.hedge_enabled = settings.hedge_enabled
+        self.hedge_percentile = settings.hedge_percentile
+        self.hedge_min_delay = settings.hedge_min_delay
+
+    def _hedge_delay(self, attempt: _Attempt) -> Optional[float]:
+        if not self.hedge_enabled:
+            return None
+        threshold = self.health.get(attempt.endpoint).ttft_percentile(self.hedge_percentile)
+        if threshold is None:
+            return None
+        return max(self.hedge_min_delay, threshold)
+
+    async def astream(self, inputs: dict, on_admitted: Callable[[], None] = None) -> AsyncIterator[str]:
+        """on_admitted 在第一次调用通过本地准入时调用（之后的对冲和故障转移不再调用）"""
+        # 对冲和故障转移只发往其他端点，不会向同一个端点重复请求
+        candidates = deque(self.health.rank(self.endpoints))
+        running: List[_Attempt] = []
+        errors = []
+        winner = None
+        first_chunk = None
+        admitted = False
+
+        def attempt_admitted():
+            nonlocal admitted
+            if not admitted:
+                admitted = True
+                if on_admitted is not None:
+                    on_admitted()
+
+        def launch():
+            index = candidates.popleft()
+            running.append(_Attempt(index, self.endpoints[index], self.chains[index], inputs, attempt_admitted))
+
+        try:
+            launch()
+            while winner is None:
+                waiters = [a.task for a in running]
+                timeout = None
+                delay = None
+                admitted_wait = None
+                if candidates and len(running) == 1 and self.hedge_enabled:
+                    attempt = running[0]
+                    if attempt.started_at is None:
+                        # 仍在本地排队：等到通过准入后再开始对冲计时
+                        admitted_wait = asyncio.ensure_future(attempt.admitted.wait())
+                        waiters.append(admitted_wait)
+                    else:
+                        delay = self._hedge_delay(attempt)
+                        if delay is not None:
+                            timeout = max(0.0, attempt.started_at + delay - time.perf_counter())
+                done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if admitted_wait is not None:
+                    if not admitted_wait.done():
+                        admitted_wait.cancel()
+                    done.discard(admitted_wait)
+                    if not done:
+                        continue
+                if not done:
+                    logger.info(
+                        f"🛡️ 首 token 超过 {delay:.2f}s，发送对冲请求: "
+                        f"{self.endpoints[candidates[0]]['openai_api_base']}"
+                    )
+                    launch()
+                    continue
+                for attempt in [a for a in running if a.task in done]:
+                    running.remove(attempt)
+                    error = attempt.task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        if winner is None:
+                            winner = attempt
+                            first_chunk = None if error else attempt.task.result()
+                            continue
+                    else:
+                        self.health.get(attempt.endpoint).record_failure()
+                        errors.append(error)
+                        logger.warning(
+                            f"⚠️ 上游调用失败 ({attempt.endpoint['openai_api_base']}, "
+                            f"{attempt.endpoint['model']}): {str(error)}"
+                        )
+                    await attempt.cancel()
+                if winner is None and not running:
+                    if not candidates:
+                        raise errors[-1]
+                    launch()
+        finally:
+            for attempt in running:
+                # 对冲中落败的端点按已等待的时间计入首 token 延迟（仍在本地排队的不计入）
+                if winner is not None and attempt.started_at is not None:
+                    self.health.get(attempt.endpoint).record_ttft(time.perf_counter() - attempt.started_at)
+                await attempt.cancel()
+
+        stats = self.health.get(winner.endpoint)
+        if winner.started_at is not None:
+            stats.record_ttft(time.perf_counter() - winner.started_at)
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+            async for chunk in winner.stream:
+                yield chunk
+        except Exception:
+            stats.record_failure()
+            raise
+        finally:
+            await winner.stream.aclose()
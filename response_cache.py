@@ -0,0 +1,225 @@
+"""
+生成结果缓存模块
+
+以 (接口, 模型, 语言, 规范化后的内容, 提示词模板版本) 为键缓存完整的流式输出，
+命中时按原有的分块（大纲为 token、内容为页面）重放，支持 LRU + TTL 淘汰，
+后端可选内存或本地 SQLite。
+
+同样的后端也用于按章节内容寻址的页面缓存（见 create_chapter_cache），
+修改大纲中的部分章节后重新提交时，未改动章节的页面直接复用。
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional
+
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_version(*templates: str) -> str:
+    """根据提示词模板内容计算版本号，模板修改后旧缓存自动失效"""
+    digest = hashlib.sha256("\0".join(templates).encode("utf-8")).hexdigest()
+    return digest[:12]
+
+
+def normalize_content(content: str) -> str:
+    """规范化用户输入：统一全角/半角、去掉首尾空白、空行和多余空格"""
+    content = unicodedata.normalize("NFKC", content)
+    lines = (" ".join(line.split()) for line in content.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class MemoryCacheBackend:
+    """进程内 LRU + TTL 缓存"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, chunks = item
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return chunks
+
+    async def set(self, key: str, chunks: List[str]):
+        self._entries[key] = (time.time() + self.ttl, chunks)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+
+class SQLiteCacheBackend:
+    """本地 SQLite 缓存，重启后仍然保留，按最近访问时间淘汰"""
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, chunks TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_accessed "
+            "ON response_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[List[str]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def _set(self, key: str, chunks: List[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(chunks, ensure_ascii=False), now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key NOT IN ("
+                "SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, chunks: List[str]):
+        await asyncio.to_thread(self._set, key, chunks)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+
+class ResponseCache:
+    """生成结果缓存，未启用时所有操作均为空操作；name 用于区分缓存命中指标"""
+
+    def __init__(self, backend=None, name: str = "response"):
+        self.backend = backend
+        self.name = name
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(endpoint: str, model: str, language: str, content: str, version: str) -> str:
+        payload = json.dumps(
+            [endpoint, model, language.strip().lower(), normalize_content(content), version],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        if not self.enabled:
+            return None
+        try:
+            chunks = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取缓存失败: {str(e)}")
+            chunks = None
+        CACHE_REQUESTS.labels(self.name, "hit" if chunks is not None else "miss").inc()
+        return chunks
+
+    async def set(self, key: str, chunks: List[str]):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set(key, chunks)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入缓存失败: {str(e)}")
+
+    async def delete(self, key: str):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"⚠️ 删除缓存失败: {str(e)}")
+
+
+async def replay_chunks(chunks: List[str]) -> AsyncIterator[str]:
+    """按原始分块重放缓存内容"""
+    for chunk in chunks:
+        yield chunk
+
+
+def create_backend(backend: str, path: str, max_entries: int, ttl: float):
+    if backend == "sqlite":
+        return SQLiteCacheBackend(path, max_entries, ttl)
+    return MemoryCacheBackend(max_entries, ttl)
+
+
+def create_response_cache(settings) -> ResponseCache:
+    """根据配置创建生成结果缓存"""
+    if not settings.response_cache_enabled:
+        return ResponseCache()
+    backend = create_backend(
+        settings.response_cache_backend,
+        settings.response_cache_path,
+        settings.response_cache_max_entries,
+        settings.response_cache_ttl,
+    )
+    logger.info(f"🗄️ 生成结果缓存已启用 (后端: {settings.response_cache_backend})")
+    return ResponseCache(backend)
+
+
+def create_chapter_cache(settings) -> ResponseCache:
+    """根据配置创建按章节内容寻址的页面缓存"""
+    if not settings.chapter_cache_enabled:
+        return ResponseCache(name="chapter")
+    backend = create_backend(
+        settings.chapter_cache_backend,
+        settings.chapter_cache_path,
+        settings.chapter_cache_max_entries,
+        settings.chapter_cache_ttl,
+    )
+    logger.info(f"🗄️ 章节页面缓存已启用 (后端: {settings.chapter_cache_backend})")
+    return ResponseCache(backend, name="chapter")
@@ -0,0 +1,153 @@
+"""
+生产部署支持
+
+- 排空：收到 SIGTERM / SIGINT 后不再接受新的生成请求（POST /tools/* 返回 503），
+  正在输出的生成流和后台任务在截止时间内继续完成，部署时不会中断生成到一半的 PPT；
+- 负载上报：每个工作进程定期把自己的负载写入共享目录，/health/load 返回本进程和
+  同一实例所有工作进程的负载，供前端代理按负载分配长时间保持的流式连接。
+"""
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import threading
+from typing import Callable, List, Optional
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class DrainState:
+    """排空状态：开始排空后记录截止时间"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.draining = False
+        self.deadline: Optional[float] = None
+
+    def start(self):
+        if self.draining:
+            return
+        self.draining = True
+        self.deadline = time.monotonic() + self.timeout
+        logger.info(f"🚰 开始排空：不再接受新的生成请求，进行中的生成最多再等待 {self.timeout:g} 秒")
+
+    def remaining(self) -> float:
+        """距离排空截止还剩的秒数"""
+        if self.deadline is None:
+            return self.timeout
+        return max(0.0, self.deadline - time.monotonic())
+
+    def install_signal_handlers(self):
+        """在服务器已安装的 SIGTERM / SIGINT 处理函数前先标记排空（只能在主线程中安装）"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                self.start()
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(sig, handler)
+
+
+class DrainMiddleware:
+    """排空期间拒绝新的生成请求，提示客户端连接其他实例重试"""
+
+    def __init__(self, app, drain: DrainState, prefix: str = "/tools/"):
+        self.app = app
+        self.drain = drain
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            self.drain.draining
+            and scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"].startswith(self.prefix)
+        ):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "服务正在重启，请稍后重试"},
+                headers={"Retry-After": "1", "Connection": "close"},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class WorkerLoadReporter:
+    """定期把本进程的负载写入共享目录，并汇总同一实例所有工作进程的负载"""
+
+    def __init__(self, state_dir: str, interval: float, snapshot: Callable[[], dict]):
+        self.state_dir = state_dir
+        self.interval = interval
+        self.snapshot = snapshot
+        self.path = os.path.join(state_dir, f"{os.getpid()}.json") if state_dir else None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def current(self) -> dict:
+        return {"pid": os.getpid(), **self.snapshot(), "updated_at": time.time()}
+
+    def _write(self, data: dict):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    async def run(self):
+        """后台循环写入负载，直到被取消"""
+        if self.path is None:
+            return
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self._write, self.current())
+                except OSError as e:
+                    logger.warning(f"⚠️ 写入工作进程负载失败: {str(e)}")
+                await asyncio.sleep(self.interval)
+        finally:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def workers(self) -> List[dict]:
+        """所有存活工作进程的负载（超过 3 个上报周期未更新的视为已退出），本进程使用实时数据"""
+        current = self.current()
+        if not self.state_dir:
+            return [current]
+        workers = [current]
+        stale_before = time.time() - self.interval * 3
+        for filename in sorted(os.listdir(self.state_dir)):
+            if not filename.endswith(".json") or filename == os.path.basename(self.path):
+                continue
+            try:
+                with open(os.path.join(self.state_dir, filename), encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("updated_at", 0) >= stale_before:
+                workers.append(data)
+        return workers
+
+
+def summarize_load(workers: List[dict]) -> dict:
+    """汇总多个工作进程的负载；load 为 (活跃 + 排队) / 总容量"""
+    capacity = sum(w.get("max_active_streams", 0) for w in workers)
+    active = sum(w.get("active_streams", 0) for w in workers)
+    queued = sum(w.get("queued_streams", 0) for w in workers)
+    return {
+        "workers": len(workers),
+        "open_streams": sum(w.get("open_streams", 0) for w in workers),
+        "active_streams": active,
+        "queued_streams": queued,
+        "running_jobs": sum(w.get("running_jobs", 0) for w in workers),
+        "load": round((active + queued) / capacity, 4) if capacity else 0.0,
+    }
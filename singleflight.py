@@ -0,0 +1,121 @@
+"""
+相同请求合并模块
+
+相同的生成请求（同一模型、语言和内容）正在进行时，后来的请求订阅同一个上游流：
+先重放已经输出的分块，再继续接收实时输出。最后一个订阅者断开时取消上游生成。
+
+上游生成在第一个订阅者开始读取时才启动：返回的流从未被读取（例如客户端在响应开始前断开）时
+不会留下无人订阅的上游调用。
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStream:
+    """被多个订阅者共享的单个上游流"""
+
+    def __init__(self, key: str, factory: Callable[[], AsyncIterator[str]], on_finish: Callable[["SharedStream"], None]):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._factory = factory
+        self._on_finish = on_finish
+        self._condition = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        source = self._factory()
+        try:
+            async for chunk in source:
+                async with self._condition:
+                    self.chunks.append(chunk)
+                    self._condition.notify_all()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("上游生成已取消")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            await source.aclose()
+            self._on_finish(self)
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """订阅共享流：先重放已输出的分块，再接收实时输出；第一个订阅者开始读取时启动上游生成"""
+        self.subscribers += 1
+        self.start()
+        index = 0
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(lambda: index < len(self.chunks) or self.done)
+                    pending = self.chunks[index:]
+                    finished = self.done
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index >= len(self.chunks):
+                    break
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and self._task is not None and not self._task.done():
+                logger.info("🔗 所有订阅者已断开，取消共享的上游生成")
+                self._on_finish(self)
+                self._task.cancel()
+
+
+class SingleFlight:
+    """按请求键合并正在进行的相同生成请求"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[str, SharedStream] = {}
+
+    def _finish(self, shared: SharedStream):
+        if self._inflight.get(shared.key) is shared:
+            del self._inflight[shared.key]
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """返回 key 对应的流；已有相同请求在进行时直接订阅该请求的输出
+        
+        尚未开始读取的共享流可能永远不会被读取，不与其合并，由本次请求的生成替换。
+        """
+        if not self.enabled:
+            return factory()
+        shared = self._inflight.get(key)
+        if shared is None or not shared.started:
+            shared = SharedStream(key, factory, self._finish)
+            self._inflight[key] = shared
+            CACHE_REQUESTS.labels("single_flight", "miss").inc()
+        else:
+            CACHE_REQUESTS.labels("single_flight", "hit").inc()
+            logger.info(f"🔗 合并相同的进行中请求 (已有 {shared.subscribers} 个订阅者)")
+        return shared.subscribe()
+
+    def is_inflight(self, key: str) -> bool:
+        """相同请求的上游生成是否已经在进行"""
+        shared = self._inflight.get(key) if self.enabled else None
+        return shared is not None and shared.started
+
+    @property
+    def inflight_count(self) -> int:
+        return len(self._inflight)
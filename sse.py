@@ -0,0 +1,99 @@
+"""
+流式响应工具
+
+- SSE 模式：把生成内容封装为带递增 id 和事件名的 Server-Sent Events，
+  空闲时发送心跳注释，防止代理在章节生成较慢时断开空闲连接；
+- 断开检测：定期检查 request.is_disconnected()，客户端断开后立即取消
+  正在进行的上游调用，不再为无人接收的 token 付费。
+"""
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = ": keep-alive\n\n"
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """响应结束后（包括客户端在开始读取响应体之前就断开）调用 on_close"""
+
+    def __init__(self, *args, on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+
+def format_event(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """按 SSE 格式封装一个事件，多行数据拆分为多个 data 字段"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_events(
+    stream: AsyncIterator[str], classify: Callable[[str], Tuple[str, str]]
+) -> AsyncIterator[str]:
+    """把原始分块转换为 SSE 事件，classify 返回 (事件名, 数据)，id 从 0 开始递增"""
+    event_id = 0
+    try:
+        async for chunk in stream:
+            event, data = classify(chunk)
+            yield format_event(data, event, event_id)
+            event_id += 1
+    finally:
+        await stream.aclose()
+
+
+async def watch_disconnect(
+    request: Request,
+    stream: AsyncIterator[str],
+    poll_interval: float,
+    heartbeat_interval: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """转发分块，等待期间检查客户端是否断开；设置 heartbeat_interval 时空闲超时发送心跳"""
+    next_chunk = None
+    last_output = time.monotonic()
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(stream.__anext__())
+            done, _ = await asyncio.wait([next_chunk], timeout=poll_interval)
+            if done:
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    next_chunk = None
+                last_output = time.monotonic()
+                yield chunk
+                continue
+            if await request.is_disconnected():
+                logger.info("🔌 客户端已断开，取消生成")
+                return
+            if heartbeat_interval and time.monotonic() - last_output >= heartbeat_interval:
+                last_output = time.monotonic()
+                yield HEARTBEAT
+    finally:
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.cancel()
+            try:
+                await next_chunk
+            except BaseException:
+                pass
+        await stream.aclose()
@@ -0,0 +1,49 @@
+"""
+启动阶段计时与就绪状态
+
+启动过程分为若干阶段（导入、LangChain 加载、提示词编译、上游预连接、模板预加载等），
+逐个记录耗时；所有必需阶段完成后标记为就绪，/health/ready 据此区分
+"进程已启动" 与 "可以处理请求"。
+"""
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """记录各启动阶段耗时（秒）和就绪状态"""
+
+    def __init__(self, started: Optional[float] = None):
+        # started 为 time.perf_counter() 值，默认为创建时刻
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.startup_seconds: Optional[float] = None
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds, 4)
+        logger.info(f"⏱️ 启动阶段 {name}: {seconds * 1000:.1f} ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个阶段的耗时；阶段失败同样记录耗时后向上抛出"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def mark_ready(self):
+        self.ready = True
+        self.startup_seconds = round(time.perf_counter() - self.started, 4)
+        logger.info(f"✅ 服务已就绪，启动耗时 {self.startup_seconds:.2f} 秒")
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "phases": dict(self.phases),
+            "startup_seconds": self.startup_seconds,
+        }
@@ -0,0 +1,166 @@
+"""
+流式响应输出阶段
+
+逐 token 输出时每个 token 都是一个 HTTP 分块（中文内容一份 PPT 有上千个很小的分块），
+系统调用、TLS 记录和代理的单块开销远大于数据本身：
+
+- 合并：缓冲的数据达到 max_bytes，或最早缓冲的分块已等待 max_delay 秒时一起输出，
+  生成较慢时最多延迟 max_delay，不影响流式体验；
+- 压缩：按 Accept-Encoding 选择 br / gzip 增量压缩，每次输出都做同步 flush，
+  客户端收到的每个分块都可以立即解压；
+- 统计：按接口记录合并前后的分块数和压缩前后的字节数，用于对比开启前后的效果。
+"""
+import zlib
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+from metrics import STREAM_BYTES, STREAM_CHUNKS
+from template_store import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 流式压缩级别：每个分块都要 flush，较高的级别收益有限且增加延迟
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+STREAM_COMPRESSION_MODES = ("off", "auto", "br", "gzip")
+
+
+def choose_encoding(accept_encoding: Optional[str], mode: str) -> Optional[str]:
+    """按 STREAM_COMPRESSION 和 Accept-Encoding 选择压缩格式，auto 时优先 br，其次 gzip"""
+    if mode not in STREAM_COMPRESSION_MODES[1:]:
+        return None
+    accepted = accepted_encodings(accept_encoding)
+    for coding in ("br", "gzip"):
+        if mode not in ("auto", coding) or coding not in accepted:
+            continue
+        if coding == "br" and brotli is None:
+            continue
+        return coding
+    return None
+
+
+class StreamEncoder:
+    """增量压缩器：encode 返回可以立即解压的数据，finish 返回结尾数据"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._gzip.flush(zlib.Z_FINISH)
+
+
+async def coalesce_chunks(
+    stream: AsyncIterator[str], max_bytes: int, max_delay: float
+) -> AsyncIterator[bytes]:
+    """把小分块合并后以 UTF-8 字节输出；max_delay 为 0 时不合并，每个分块单独输出"""
+    if max_delay <= 0 or max_bytes <= 0:
+        try:
+            async for chunk in stream:
+                yield chunk.encode("utf-8")
+        finally:
+            await stream.aclose()
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer = []
+    size = 0
+    deadline = 0.0
+    next_chunk = None
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(stream.__anext__())
+            if buffer:
+                done, _ = await asyncio.wait([next_chunk], timeout=max(0.0, deadline - loop.time()))
+                if not done:
+                    yield b"".join(buffer)
+                    buffer, size = [], 0
+                    continue
+            else:
+                await asyncio.wait([next_chunk])
+            try:
+                data = next_chunk.result().encode("utf-8")
+            except StopAsyncIteration:
+                break
+            finally:
+                next_chunk = None
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(data)
+            size += len(data)
+            if size >= max_bytes:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield b"".join(buffer)
+    finally:
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.cancel()
+            try:
+                await next_chunk
+            except BaseException:
+                pass
+        await stream.aclose()
+
+
+async def output_stream(
+    endpoint: str,
+    stream: AsyncIterator[str],
+    max_bytes: int,
+    max_delay: float,
+    encoding: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """合并、压缩并统计一个流式响应"""
+    counts = {"in": 0, "out": 0, "raw": 0, "wire": 0}
+
+    async def counted() -> AsyncIterator[str]:
+        try:
+            async for chunk in stream:
+                counts["in"] += 1
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    encoder = StreamEncoder(encoding) if encoding else None
+    chunks = coalesce_chunks(counted(), max_bytes, max_delay)
+    try:
+        async for data in chunks:
+            counts["raw"] += len(data)
+            if encoder is not None:
+                data = encoder.encode(data)
+            counts["out"] += 1
+            counts["wire"] += len(data)
+            yield data
+        if encoder is not None:
+            data = encoder.finish()
+            counts["out"] += 1
+            counts["wire"] += len(data)
+            yield data
+    finally:
+        await chunks.aclose()
+        STREAM_CHUNKS.labels(endpoint, "in").inc(counts["in"])
+        STREAM_CHUNKS.labels(endpoint, "out").inc(counts["out"])
+        STREAM_BYTES.labels(endpoint, "raw").inc(counts["raw"])
+        STREAM_BYTES.labels(endpoint, "wire").inc(counts["wire"])
+        logger.info(
+            f"📦 {endpoint} 输出: {counts['in']} 个分块合并为 {counts['out']} 个, "
+            f"{counts['raw']} → {counts['wire']} 字节 ({encoding or '未压缩'})"
+        )
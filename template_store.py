@@ -0,0 +1,438 @@
+"""
+模板文件缓存模块
+
+每个 template/*.json 只在首次访问（或启动预加载）时读取并校验一次，
+缓存可直接发送的字节、预压缩的 gzip/brotli 版本以及强 ETag，
+文件修改时间变化时才重新加载。
+
+加载时同时建立幻灯片索引（类型、条目数、元素/图片字节数），
+以便只返回主题信息、幻灯片清单或按类型/条目数筛选的部分幻灯片。
+
+配置共享目录后，编码好的模板（原始字节、压缩版本和索引）会写入该目录下的
+映射文件，各工作进程只读映射同一文件，内容由操作系统页缓存共享，
+响应直接从映射中发送，压缩也只需由第一个进程完成一次
+（生成时持有该模板的文件锁，同时启动的其他进程等待后直接映射）。
+"""
+import os
+import json
+import gzip
+import mmap
+import struct
+import tempfile
+import asyncio
+import hashlib
+import logging
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，多进程可能重复生成映射文件
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# 模板片段（主题、清单、部分幻灯片）较小，超过该字节数才以较低级别 gzip 压缩
+FRAGMENT_GZIP_MIN_BYTES = 1024
+FRAGMENT_GZIP_LEVEL = 6
+# 模板元信息中除幻灯片外的字段
+META_FIELDS = ("title", "width", "height", "theme")
+# 映射文件格式：魔数 + 头部长度 + JSON 头部 + 各段数据
+MAPPED_MAGIC = b"PPTTPL1\n"
+
+
+def dump_json(data) -> bytes:
+    """与 FastAPI 默认 JSONResponse 的编码方式保持一致"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> Set[str]:
+    """解析 Accept-Encoding，返回 q > 0 的压缩格式"""
+    accepted = set()
+    if not accept_encoding:
+        return accepted
+    for part in accept_encoding.split(","):
+        coding, *params = part.strip().split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """判断 If-None-Match 是否命中 ETag"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def text_type(element: dict) -> Optional[str]:
+    """文本元素或形状内文本的用途（title、content、item、itemTitle 等）"""
+    if element.get("type") == "text":
+        return element.get("textType")
+    if element.get("type") == "shape" and element.get("text"):
+        return element["text"].get("type")
+    return None
+
+
+def count_items(slide: dict) -> int:
+    """幻灯片中可填充的条目数（目录项或内容条目）"""
+    return sum(1 for e in slide.get("elements", []) if text_type(e) == "item")
+
+
+def image_bytes(slide: dict) -> int:
+    """幻灯片中内嵌图片（元素和背景）的字节数"""
+    size = sum(len(e.get("src", "")) for e in slide.get("elements", []) if e.get("type") == "image")
+    background = slide.get("background") or {}
+    if background.get("type") == "image":
+        size += len((background.get("image") or {}).get("src", ""))
+    return size
+
+
+@dataclass
+class SlideInfo:
+    """幻灯片索引项"""
+    index: int
+    id: Optional[str]
+    type: Optional[str]
+    items: int
+    elements: int
+    bytes: int
+    image_bytes: int
+
+
+@dataclass
+class TemplateFragment:
+    """可直接发送的模板片段：原始字节、强 ETag 和 gzip 版本（较小的片段不压缩）"""
+    body: bytes
+    etag: str
+    gzip: Optional[bytes] = None
+
+    @classmethod
+    def build(cls, body: bytes) -> "TemplateFragment":
+        compressed = None
+        if len(body) > FRAGMENT_GZIP_MIN_BYTES:
+            compressed = gzip.compress(body, compresslevel=FRAGMENT_GZIP_LEVEL, mtime=0)
+        return cls(body=body, etag=f'"{hashlib.sha256(body).hexdigest()}"', gzip=compressed)
+
+
+@dataclass
+class TemplateEntry:
+    """单个模板文件的缓存条目"""
+    name: str
+    mtime_ns: int
+    body: bytes
+    etag: str
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+    meta: bytes = b"{}"
+    manifest: bytes = b"{}"
+    slides: List[SlideInfo] = field(default_factory=list)
+    # 每张幻灯片在 body 中的 (起始, 结束) 字节位置
+    slide_spans: List[tuple] = field(default_factory=list)
+    # 加载时预先生成的主题和清单片段
+    meta_fragment: Optional[TemplateFragment] = None
+    manifest_fragment: Optional[TemplateFragment] = None
+
+    def build_fragments(self):
+        """为主题和清单预先计算 ETag 和压缩版本"""
+        self.meta_fragment = TemplateFragment.build(self.meta)
+        self.manifest_fragment = TemplateFragment.build(self.manifest)
+
+    def select_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """根据 Accept-Encoding 选择可用的压缩格式，优先 br，其次 gzip"""
+        accepted = accepted_encodings(accept_encoding)
+        for coding in ("br", "gzip"):
+            if coding in self.encoded and (coding in accepted or "*" in accepted):
+                return coding
+        return None
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """判断 If-None-Match 是否命中当前 ETag"""
+        return etag_matches(self.etag, if_none_match)
+
+    def select_slides(
+        self,
+        types: Optional[Iterable[str]] = None,
+        items: Optional[Iterable[int]] = None,
+        ids: Optional[Iterable[str]] = None,
+    ) -> List[SlideInfo]:
+        """按类型、条目数和 ID 筛选幻灯片，未指定的条件不做限制"""
+        types = set(types) if types else None
+        items = set(items) if items else None
+        ids = set(ids) if ids else None
+        return [
+            info for info in self.slides
+            if (types is None or info.type in types)
+            and (items is None or info.items in items)
+            and (ids is None or info.id in ids)
+        ]
+
+    def load_slide(self, index: int) -> dict:
+        """解析单张幻灯片，每次返回新的对象，可直接修改"""
+        start, end = self.slide_spans[index]
+        return json.loads(memoryview(self.body)[start:end].tobytes())
+
+    def slides_body(self, selected: List[SlideInfo]) -> bytes:
+        """由元信息和选中的幻灯片拼出与完整模板结构相同的 JSON"""
+        view = memoryview(self.body)
+        parts = [bytes(view[start:end]) for start, end in (self.slide_spans[i.index] for i in selected)]
+        return self.meta[:-1] + (b',"slides":[' if len(self.meta) > 2 else b'"slides":[') + b",".join(parts) + b"]}"
+
+
+def write_mapped(path: str, entry: TemplateEntry):
+    """把编码好的模板写入映射文件（先写临时文件再原子替换）"""
+    sections = [("body", entry.body)] + [(f"encoded:{k}", v) for k, v in entry.encoded.items()]
+    offsets, position = {}, 0
+    for key, data in sections:
+        offsets[key] = [position, len(data)]
+        position += len(data)
+    header = dump_json({
+        "etag": entry.etag,
+        "meta": entry.meta.decode("utf-8"),
+        "manifest": entry.manifest.decode("utf-8"),
+        "slides": [asdict(info) for info in entry.slides],
+        "spans": entry.slide_spans,
+        "sections": offsets,
+    })
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAPPED_MAGIC + struct.pack("<Q", len(header)) + header)
+            for _, data in sections:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_mapped(path: str, name: str, mtime_ns: int) -> TemplateEntry:
+    """只读映射模板文件，条目中的字节均为映射上的零拷贝视图"""
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+    if view[:len(MAPPED_MAGIC)] != MAPPED_MAGIC:
+        raise ValueError("映射文件格式不匹配")
+    start = len(MAPPED_MAGIC) + 8
+    (header_length,) = struct.unpack("<Q", view[len(MAPPED_MAGIC):start])
+    header = json.loads(view[start:start + header_length].tobytes())
+    data_start = start + header_length
+
+    def section(key: str) -> memoryview:
+        offset, length = header["sections"][key]
+        return view[data_start + offset:data_start + offset + length]
+
+    entry = TemplateEntry(
+        name=name,
+        mtime_ns=mtime_ns,
+        body=section("body"),
+        etag=header["etag"],
+        encoded={key.split(":", 1)[1]: section(key) for key in header["sections"] if key.startswith("encoded:")},
+        meta=header["meta"].encode("utf-8"),
+        manifest=header["manifest"].encode("utf-8"),
+        slides=[SlideInfo(**info) for info in header["slides"]],
+        slide_spans=[tuple(span) for span in header["spans"]],
+    )
+    entry.build_fragments()
+    logger.info(f"📦 模板已映射: {name}.json ({len(mapping)} 字节, {path})")
+    return entry
+
+
+class TemplateStore:
+    """模板文件缓存，按文件修改时间自动失效"""
+
+    def __init__(self, directory: str, shared_dir: Optional[str] = None):
+        self.directory = directory
+        self.shared_dir = shared_dir
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def mapped_path_for(self, name: str, mtime_ns: int) -> str:
+        return os.path.join(self.shared_dir, f"{name}-{mtime_ns}.tpl")
+
+    def _load(self, name: str, mtime_ns: int) -> TemplateEntry:
+        """加载模板：启用共享目录时优先映射其他进程已生成的文件"""
+        if not self.shared_dir:
+            return self._build(name, mtime_ns)
+        path = self.mapped_path_for(name, mtime_ns)
+        entry = self._read_existing(path, name, mtime_ns)
+        if entry is not None:
+            return entry
+        with self._build_lock(name):
+            # 等待锁期间其他进程可能已经生成了映射文件
+            entry = self._read_existing(path, name, mtime_ns)
+            if entry is not None:
+                return entry
+            entry = self._build(name, mtime_ns)
+            try:
+                write_mapped(path, entry)
+                self._remove_stale(name, path)
+                return read_mapped(path, name, mtime_ns)
+            except OSError as e:
+                logger.warning(f"⚠️ 写入模板映射文件失败，使用进程内缓存: {path} - {str(e)}")
+                return entry
+
+    @staticmethod
+    def _read_existing(path: str, name: str, mtime_ns: int) -> Optional[TemplateEntry]:
+        """映射已存在的映射文件；不存在或读取失败时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return read_mapped(path, name, mtime_ns)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取模板映射文件失败，重新生成: {path} - {str(e)}")
+            return None
+
+    @contextmanager
+    def _build_lock(self, name: str):
+        """多进程间互斥地生成同一模板的映射文件（无法加锁时不互斥）"""
+        lock_file = None
+        if fcntl is not None:
+            try:
+                os.makedirs(self.shared_dir, exist_ok=True)
+                lock_file = open(os.path.join(self.shared_dir, f"{name}.lock"), "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.warning(f"⚠️ 获取模板文件锁失败: {name} - {str(e)}")
+                if lock_file is not None:
+                    lock_file.close()
+                    lock_file = None
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _remove_stale(self, name: str, current: str):
+        """删除同一模板旧版本的映射文件（已映射的进程不受影响）"""
+        for filename in os.listdir(self.shared_dir):
+            path = os.path.join(self.shared_dir, filename)
+            if filename.startswith(f"{name}-") and filename.endswith(".tpl") and path != current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _build(self, name: str, mtime_ns: int) -> TemplateEntry:
+        """读取并校验模板文件，生成发送字节、压缩版本和 ETag"""
+        with open(self.path_for(name), "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        body = dump_json(data)
+        entry = TemplateEntry(
+            name=name,
+            mtime_ns=mtime_ns,
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()}"',
+        )
+        if isinstance(data, dict):
+            self._build_index(entry, data)
+        entry.build_fragments()
+        entry.encoded["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            entry.encoded["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+        logger.info(
+            f"📦 模板已缓存: {name}.json "
+            f"(原始 {len(body)} 字节, "
+            + ", ".join(f"{k} {len(v)} 字节" for k, v in entry.encoded.items())
+            + ")"
+        )
+        return entry
+
+    @staticmethod
+    def _build_index(entry: TemplateEntry, data: dict):
+        """建立幻灯片索引，并定位每张幻灯片在 body 中的位置"""
+        meta = {key: data[key] for key in META_FIELDS if key in data}
+        entry.meta = dump_json(meta)
+        slides = data.get("slides")
+        if isinstance(slides, list) and slides and all(isinstance(slide, dict) for slide in slides):
+            parts = [dump_json(slide) for slide in slides]
+            # 紧凑编码下各幻灯片在 body 中依次以逗号分隔
+            offset = entry.body.find(b'"slides":[' + parts[0]) + len(b'"slides":[')
+            for slide, part in zip(slides, parts):
+                if entry.body[offset:offset + len(part)] != part:
+                    logger.warning(f"⚠️ 无法定位模板幻灯片，跳过索引: {entry.name}.json")
+                    entry.slides.clear()
+                    entry.slide_spans.clear()
+                    break
+                entry.slide_spans.append((offset, offset + len(part)))
+                entry.slides.append(SlideInfo(
+                    index=len(entry.slides),
+                    id=slide.get("id"),
+                    type=slide.get("type"),
+                    items=count_items(slide),
+                    elements=len(slide.get("elements", [])),
+                    bytes=len(part),
+                    image_bytes=image_bytes(slide),
+                ))
+                offset += len(part) + 1
+        entry.manifest = dump_json({**meta, "slides": [asdict(info) for info in entry.slides]})
+
+    async def get(self, name: str) -> Optional[TemplateEntry]:
+        """获取模板缓存条目，文件不存在时返回 None
+
+        文件内容不是合法 JSON 时抛出 json.JSONDecodeError。
+        """
+        if os.sep in name or (os.altsep and os.altsep in name) or name.startswith("."):
+            return None
+        try:
+            mtime_ns = os.stat(self.path_for(name)).st_mtime_ns
+        except FileNotFoundError:
+            self._entries.pop(name, None)
+            return None
+
+        entry = self._entries.get(name)
+        if entry is not None and entry.mtime_ns == mtime_ns:
+            CACHE_REQUESTS.labels("template", "hit").inc()
+            return entry
+        CACHE_REQUESTS.labels("template", "miss").inc()
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.mtime_ns != mtime_ns:
+                entry = await asyncio.to_thread(self._load, name, mtime_ns)
+                self._entries[name] = entry
+        return entry
+
+    async def preload(self):
+        """启动时预加载目录下的所有模板文件"""
+        if not os.path.isdir(self.directory):
+            logger.warning(f"📁 模板目录不存在: {self.directory}")
+            return
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".json"):
+                continue
+            name = filename[:-len(".json")]
+            try:
+                await self.get(name)
+            except Exception as e:
+                logger.warning(f"⚠️ 预加载模板失败: {filename} - {str(e)}")
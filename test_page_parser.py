@@ -0,0 +1,37 @@
+"""
+PageExtractor 增量解析测试（python -m pytest test_page_parser.py）
+"""
+import json
+
+from page_parser import PageExtractor
+
+PAGES = [
+    {"type": "transition", "data": {"title": "引言 \\ \"背景\"", "text": "路径 C:\\\\temp"}},
+    {"type": "content", "data": {"title": "要点", "items": [{"title": "\"A\"", "text": "a\\b"}]}},
+]
+TEXT = "\n".join(json.dumps(page, ensure_ascii=False) for page in PAGES)
+
+
+def extract(chunks) -> list:
+    extractor = PageExtractor()
+    pages = []
+    for chunk in chunks:
+        pages.extend(extractor.feed(chunk))
+    assert extractor.close() is None
+    return [page.data for page in pages]
+
+
+def test_whole_text():
+    assert extract([TEXT]) == PAGES
+
+
+def test_split_at_every_position():
+    for i in range(len(TEXT) + 1):
+        assert extract([TEXT[:i], TEXT[i:]]) == PAGES, i
+
+
+def test_empty_chunk_after_split_escape():
+    # 以反斜杠结尾的分块之后出现空分块时，转义状态应保留到下一个非空分块
+    for i, ch in enumerate(TEXT):
+        if ch == "\\":
+            assert extract([TEXT[:i + 1], "", "", TEXT[i + 1:]]) == PAGES, i
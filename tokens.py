@@ -0,0 +1,18 @@
+"""
+token 数量估算
+
+不依赖具体模型的分词器：中日韩字符按 1 个 token 计，
+其余文本按约 4 个字符 1 个 token 计，用于统计和预算估计。
+"""
+import re
+
+_CJK = re.compile(r"[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4